@@ -1,186 +1,1834 @@
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import asyncio
-from bleak import BleakClient, BleakScanner
+import atexit
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
 import os
 
+# BLE_BACKEND=simulator swaps Bleak for in-memory devices (see ble_simulator.py)
+if os.getenv("BLE_BACKEND") == "simulator":
+    from ble_simulator import SimulatedBleakClient as BleakClient
+    from ble_simulator import SimulatedBleakScanner as BleakScanner
+    from ble_simulator import simulator
+    if not simulator.devices:
+        simulator.from_env()
+else:
+    from bleak import BleakClient, BleakScanner
+
+from protocol import FRAME_SIZE, build_scent_command, decode_frames
+from capture import CaptureLog
+from device_store import DeviceStore
+from metrics import LATENESS_BUCKETS, MetricsRegistry
+from ble_logging import LazyHex, configure_logging
+from ble_client import DEFAULT_ADDRESS as DEFAULT_DAEMON_ADDRESS, DaemonClient, DaemonError
+
+configure_logging()
+log = logging.getLogger("backend")
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes to allow communication with AI frontend
 
 # Device configuration
 DEVICE_NAME_KEYWORD = "wear"  # Device name must contain this keyword
 WRITE_CHAR_UUID = "6e400002-b5a3-f393-e0a9-e50e24dcca9e"
+# Nordic UART service that owns WRITE_CHAR_UUID. Advertising it counts as
+# a match even when the name is missing from the scan response.
+UART_SERVICE_UUID = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
+MATCH_SERVICE_UUID = os.getenv("BLE_MATCH_SERVICE_UUID", "1") == "1"
+# Optional manufacturer data match, e.g. BLE_MANUFACTURER_ID=0x0059 and
+# BLE_MANUFACTURER_PREFIX=0102 (hex) for the first payload bytes
+MANUFACTURER_ID = int(os.getenv("BLE_MANUFACTURER_ID"), 0) if os.getenv("BLE_MANUFACTURER_ID") else None
+MANUFACTURER_PREFIX = bytes.fromhex(os.getenv("BLE_MANUFACTURER_PREFIX", ""))
+# After the first match, keep listening this long so the strongest device wins
+SCAN_SETTLE = float(os.getenv("BLE_SCAN_SETTLE", "0.3"))
+# UART TX characteristic. Devices that notify on it after a command get
+# their commands acknowledged and their round-trip time measured.
+NOTIFY_CHAR_UUID = "6e400003-b5a3-f393-e0a9-e50e24dcca9e"
+# How long a sequence step waits for its acknowledgement before resending once
+ACK_TIMEOUT = float(os.getenv("BLE_ACK_TIMEOUT", "0.5"))
+
+# "response" waits for an ATT write response per write; "no-response" uses
+# write-without-response wherever the characteristic allows it
+WRITE_MODES = ("response", "no-response")
+WRITE_MODE = os.getenv("BLE_WRITE_MODE", "response")
+# Coalesce frames queued back to back into one MTU-sized write; only for
+# firmware that parses several frames per write
+BATCH_WRITES = os.getenv("BLE_BATCH_WRITES", "0") == "1"
+# ATT header bytes taken out of every write
+ATT_HEADER_SIZE = 3
+
+# BLE_DAEMON=1 (or a socket path / host:port) forwards every BLE command
+# to a running ble_daemon.py instead of owning the adapter in this
+# process, so the HTTP layer can run under a multi-worker server
+BLE_DAEMON = os.getenv("BLE_DAEMON")
+if BLE_DAEMON == "1":
+    BLE_DAEMON = DEFAULT_DAEMON_ADDRESS
+daemon_client = DaemonClient(BLE_DAEMON) if BLE_DAEMON else None
+
+# Advertisement registry: entries not seen for this long are dropped
+DEVICE_TTL = float(os.getenv("BLE_DEVICE_TTL", "30"))
+# Keep a scanner running in the background so lookups never wait on a scan
+BACKGROUND_SCAN = os.getenv("BLE_BACKGROUND_SCAN", "1") == "1"
+
+# Fleet aliases, e.g. BLE_DEVICE_ALIASES="left=AA:BB:CC:DD:EE:01,right=AA:BB:CC:DD:EE:02"
+DEVICE_ALIASES = dict(
+    entry.split("=", 1) for entry in os.getenv("BLE_DEVICE_ALIASES", "").split(",") if "=" in entry
+)
+DEVICE_ALIASES = {alias.strip(): address.strip() for alias, address in DEVICE_ALIASES.items()}
+# How long to scan for a named device that has not advertised yet
+SCAN_TIMEOUT = 10.0
+
+# Headroom between pre-connecting a group and its shared start deadline
+GROUP_START_DELAY = 0.5
+
+# What a new command does when its device is busy: append, preempt or reject
+QUEUE_POLICIES = ("append", "preempt", "reject")
+QUEUE_POLICY = os.getenv("BLE_QUEUE_POLICY", "append")
+
+# Smoothing factor for the per-device write latency used as lead time
+WRITE_LATENCY_ALPHA = 0.2
+
+# Opt-in startup warm-up: connect BLE_WARMUP_DEVICES (default: every alias,
+# or the first keyword match) before serving, then keep those links alive
+WARMUP = os.getenv("BLE_WARMUP", "0") == "1"
+WARMUP_DEVICES = [d.strip() for d in os.getenv("BLE_WARMUP_DEVICES", "").split(",") if d.strip()]
+# Idle links get an empty write without response this often
+KEEPALIVE_INTERVAL = float(os.getenv("BLE_KEEPALIVE_INTERVAL", "15"))
+# Kept-alive links are reconnected with exponential backoff between these bounds
+RECONNECT_BACKOFF_INITIAL = 1.0
+RECONNECT_BACKOFF_MAX = float(os.getenv("BLE_RECONNECT_MAX_BACKOFF", "60"))
+
+# Record every written frame for offline replay (see capture.py). With
+# BLE_DAEMON set the daemon owns the capture file, not the HTTP workers
+CAPTURE_PATH = os.getenv("BLE_CAPTURE_PATH")
+capture_log = CaptureLog(CAPTURE_PATH) if CAPTURE_PATH and not BLE_DAEMON else None
+
+# Hot-path instrumentation, scraped from /metrics
+metrics = MetricsRegistry()
+scan_seconds = metrics.histogram(
+    "ble_scan_seconds", "Time spent scanning for a device the registry did not know", ("result",))
+cache_verify_seconds = metrics.histogram(
+    "ble_cache_verify_seconds", "Time to verify the cached device in find_device_by_name", ("result",))
+connect_seconds = metrics.histogram("ble_connect_seconds", "BleakClient.connect latency", ("result",))
+write_seconds = metrics.histogram("ble_write_seconds", "write_gatt_char latency")
+sequence_lateness_seconds = metrics.histogram(
+    "ble_sequence_lateness_seconds", "How late each sequence step landed on its deadline", buckets=LATENESS_BUCKETS)
+reconnects_total = metrics.counter("ble_reconnects_total", "Reconnects after a dropped link", ("result",))
+ack_rtt_seconds = metrics.histogram("ble_ack_rtt_seconds", "Time from write to acknowledging notification")
+ack_rtt_smoothed_seconds = metrics.gauge(
+    "ble_ack_rtt_smoothed_seconds", "Smoothed acknowledgement round-trip time per device", ("address",))
+acks_total = metrics.counter("ble_acks_total", "Acknowledgements by outcome", ("result",))
+keepalives_total = metrics.counter("ble_keepalives_total", "Keepalive writes on idle links", ("result",))
+write_errors_total = metrics.counter("ble_write_errors_total", "Failed writes")
+frame_errors_total = metrics.counter("ble_frame_errors_total", "Frames that failed to encode or CRC-check", ("kind",))
+scent_seconds_total = metrics.counter("ble_scent_seconds_total", "Seconds of scent sent per channel", ("channel",))
+# Export both error kinds from the start so rates work before the first error
+for kind in ("encode", "crc"):
+    frame_errors_total.inc(kind, amount=0)
+
+# Devices connected before are remembered across restarts ("" disables)
+DEVICE_STORE_PATH = os.getenv(
+    "BLE_DEVICE_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ble_devices.json")
+)
+# Only the process that owns the adapter keeps the store; HTTP workers
+# forwarding to a daemon would race it on the file
+device_store = DeviceStore(DEVICE_STORE_PATH or None) if not BLE_DAEMON else None
+
+# Cache for device address to avoid scanning every time, seeded from the
+# store so a restart can connect without scanning first
+_cached_device_address = device_store.most_recent() if device_store is not None else None
+
+
+class BLEConnectionManager:
+    """
+    Keeps one long-lived BleakClient per device address so routes can
+    write to an already-open GATT link instead of connecting per request.
+    Dropped links are re-established from the disconnect callback.
+    Pinned links are also kept alive while idle and reconnected with
+    exponential backoff until they come back. Notifications on the UART TX
+    characteristic acknowledge writes in order and give a per-device RTT.
+    """
+
+    def __init__(self, connect_timeout: float = 10.0):
+        self.connect_timeout = connect_timeout
+        self._clients = {}
+        self._locks = {}
+        self._reconnect_tasks = set()
+        self._write_latency = {}
+        self._rtt = {}
+        self._mtu = {}
+        self._with_response = {}
+        self._pending_acks = {}
+        self._acking = set()
+        self._last_used = {}
+        self._pinned = set()
+        self._reconnecting = set()
+        self._keepalive_task = None
+        self._loop = None
+        self._closing = False
+
+    def _bind_loop(self):
+        # Bleak objects belong to the event loop that created them, so a
+        # new loop cannot reuse links opened on a previous one.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._clients.clear()
+            self._locks.clear()
+            self._reconnect_tasks.clear()
+            self._reconnecting.clear()
+            self._keepalive_task = None
+            self._loop = loop
+
+    def is_connected(self, address: str) -> bool:
+        client = self._clients.get(address)
+        return client is not None and client.is_connected
+
+    def write_latency(self, address: str) -> float:
+        """Smoothed write_gatt_char latency for address in seconds"""
+        return self._write_latency.get(address, 0.0)
+
+    def rtt(self, address: str):
+        """Smoothed acknowledgement round-trip time in seconds, or None"""
+        return self._rtt.get(address)
+
+    def lead_time(self, address: str) -> float:
+        """How early to issue a write so it lands on its deadline"""
+        return max(self.write_latency(address), self._rtt.get(address, 0.0) / 2)
+
+    def mtu(self, address: str):
+        """Negotiated ATT MTU for address, or None before the first connect"""
+        return self._mtu.get(address)
+
+    def write_mode(self, address: str) -> str:
+        return "response" if self._with_response.get(address, True) else "no-response"
+
+    def frames_per_write(self, address: str) -> int:
+        """How many frames fit in one write at the negotiated MTU"""
+        return max(1, (self._mtu.get(address, 23) - ATT_HEADER_SIZE) // FRAME_SIZE)
+
+    def supports_acks(self, address: str) -> bool:
+        """True once the device has acknowledged a write"""
+        return address in self._acking
+
+    async def get_client(self, address: str):
+        """Return a connected client for address, connecting if needed"""
+        self._bind_loop()
+        lock = self._locks.setdefault(address, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(address)
+            if client is not None and client.is_connected:
+                return client
+
+            log.info("Connecting to device %s...", address, extra={"address": address})
+            client = BleakClient(
+                address,
+                disconnected_callback=self._on_disconnect,
+                timeout=self.connect_timeout,
+            )
+            started = time.monotonic()
+            try:
+                await client.connect()
+            except Exception:
+                connect_seconds.observe(time.monotonic() - started, "error")
+                # The store writes a file; keep that off the event loop
+                self._loop.run_in_executor(None, device_store.record_failure, address)
+                raise
+            connect_seconds.observe(time.monotonic() - started, "ok")
+            self._clients[address] = client
+            self._last_used[address] = time.monotonic()
+            await self._negotiate(address, client)
+            await self._subscribe(address, client)
+            self._remember(address, client)
+            log.info("Connected successfully!", extra={"address": address})
+            return client
+
+    async def _negotiate(self, address: str, client):
+        """Record the MTU and pick the write mode for this link"""
+        acquire_mtu = getattr(getattr(client, "_backend", None), "_acquire_mtu", None)
+        if acquire_mtu is not None:
+            # BlueZ only reports the real MTU after it has been acquired
+            try:
+                await acquire_mtu()
+            except Exception as e:
+                log.debug("Could not acquire MTU for %s: %s", address, e)
+        self._mtu[address] = getattr(client, "mtu_size", 23)
+        with_response = True
+        if WRITE_MODE == "no-response":
+            try:
+                characteristic = client.services.get_characteristic(WRITE_CHAR_UUID)
+                with_response = "write-without-response" not in characteristic.properties
+            except Exception as e:
+                log.debug("Could not read properties for %s: %s", address, e)
+            if with_response:
+                log.info("%s does not allow write-without-response, using write requests", address)
+        self._with_response[address] = with_response
+        log.debug("MTU %d, %s writes on %s", self._mtu[address], self.write_mode(address), address)
+
+    async def _subscribe(self, address: str, client):
+        """Listen for acknowledgements on the UART TX characteristic, if any"""
+        try:
+            characteristic = client.services.get_characteristic(NOTIFY_CHAR_UUID)
+            if characteristic is None or "notify" not in characteristic.properties:
+                return
+            # Bounded, so a device that never answers cannot grow it
+            self._pending_acks[address] = collections.deque(maxlen=32)
+            await client.start_notify(NOTIFY_CHAR_UUID, lambda sender, data: self._on_notify(address, data))
+        except Exception as e:
+            self._pending_acks.pop(address, None)
+            log.info("Notifications unavailable on %s: %s", address, e, extra={"address": address})
+
+    def _on_notify(self, address: str, data: bytearray):
+        """
+        Treat a notification as the acknowledgement of the pending write it
+        echoes, or of the oldest pending write if it echoes none of them
+        """
+        now = time.monotonic()
+        if data and len(data) % FRAME_SIZE == 0:
+            try:
+                if not all(crc_ok for _, _, crc_ok in decode_frames(data)):
+                    frame_errors_total.inc("crc")
+            except ValueError:
+                pass
+        pending = self._pending_acks.get(address)
+        # Writes whose wait timed out are expired; a late notification must not be matched to them
+        waiting = [entry for entry in pending or () if not entry[1].done()]
+        if pending is not None and len(waiting) < len(pending):
+            pending.clear()
+            pending.extend(waiting)
+        echoed = bytes(data)
+        entry = next((e for e in waiting if e[2] == echoed), waiting[0] if waiting else None)
+        if entry is not None:
+            pending.remove(entry)
+            sent_at, ack, _ = entry
+            rtt = now - sent_at
+            ack.set_result(rtt)
+            self._acking.add(address)
+            previous = self._rtt.get(address)
+            self._rtt[address] = rtt if previous is None else previous + WRITE_LATENCY_ALPHA * (rtt - previous)
+            ack_rtt_seconds.observe(rtt)
+            ack_rtt_smoothed_seconds.set(self._rtt[address], address)
+            acks_total.inc("ok")
+            return
+        acks_total.inc("unsolicited")
+
+    def _drop_acks(self, address: str):
+        pending = self._pending_acks.pop(address, None)
+        while pending:
+            _, ack, _ = pending.popleft()
+            ack.cancel()
+
+    async def wait_for_ack(self, address: str, ack, timeout: float = ACK_TIMEOUT):
+        """
+        Wait for the acknowledgement returned by write and return the RTT
+        in seconds. Returns None at once for devices that do not acknowledge,
+        or after timeout if the acknowledgement never came.
+        """
+        if ack is None or address not in self._acking:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(ack), timeout)
+        except asyncio.TimeoutError:
+            acks_total.inc("timeout")
+            # Expire it, or the next notification would be credited to this write
+            ack.cancel()
+            return None
+        except asyncio.CancelledError:
+            # The link dropped while waiting; anything else is our own cancellation
+            if ack.cancelled():
+                acks_total.inc("lost")
+                return None
+            raise
+
+    def _remember(self, address: str, client):
+        """Persist the device's name, RSSI and write handle after a connect"""
+        info = device_registry.get(address)
+        handles = {}
+        try:
+            for role, uuid in (("write", WRITE_CHAR_UUID), ("notify", NOTIFY_CHAR_UUID)):
+                characteristic = client.services.get_characteristic(uuid)
+                if characteristic is not None:
+                    handles[role] = characteristic.handle
+        except Exception as e:
+            log.debug("Could not resolve handles for %s: %s", address, e)
+        self._loop.run_in_executor(
+            None, device_store.record_connect, address,
+            info.name if info else getattr(client, "name", None), info.rssi if info else None, handles,
+            self._mtu.get(address),
+        )
+
+    async def write(self, address: str, data: bytes):
+        """
+        Write a frame to the device over its persistent link. Returns a
+        future for its acknowledgement if the device has notifications,
+        else None; pass it to wait_for_ack.
+        """
+        client = await self.get_client(address)
+        ack = None
+        try:
+            started = time.monotonic()
+            pending = self._pending_acks.get(address)
+            if pending is not None:
+                # Queued before writing: the notification can beat the write response
+                ack = self._loop.create_future()
+                pending.append((started, ack, bytes(data)))
+            await client.write_gatt_char(WRITE_CHAR_UUID, data, response=self._with_response.get(address, True))
+            latency = time.monotonic() - started
+            write_seconds.observe(latency)
+            self._observe_write_latency(address, latency)
+            self._last_used[address] = time.monotonic()
+            if capture_log is not None:
+                # One record per frame, so a batched write dumps and replays frame by frame
+                step = FRAME_SIZE if len(data) % FRAME_SIZE == 0 else len(data)
+                for offset in range(0, len(data), step):
+                    capture_log.record(address, data[offset:offset + step], started)
+            return ack
+        except Exception:
+            write_errors_total.inc()
+            # Force a fresh connection on the next write
+            await self.disconnect(address)
+            raise
+
+    def _observe_write_latency(self, address: str, latency: float):
+        previous = self._write_latency.get(address)
+        if previous is None:
+            self._write_latency[address] = latency
+        else:
+            self._write_latency[address] = previous + WRITE_LATENCY_ALPHA * (latency - previous)
+
+    async def measure_lead(self, address: str) -> float:
+        """
+        Time an empty write in the device's write mode if nothing has been
+        written on the link yet, so that even its first frame is issued
+        early. Returns lead_time(address).
+        """
+        if address not in self._write_latency:
+            try:
+                client = await self.get_client(address)
+                started = time.monotonic()
+                await client.write_gatt_char(WRITE_CHAR_UUID, b"", response=self._with_response.get(address, True))
+                self._observe_write_latency(address, time.monotonic() - started)
+            except Exception as e:
+                log.warning("Could not measure lead time for %s: %s", address, e, extra={"address": address})
+        return self.lead_time(address)
+
+    def _on_disconnect(self, client):
+        address = client.address
+        if self._closing or self._clients.get(address) is not client:
+            return
+        log.warning("Device %s disconnected, reconnecting...", address, extra={"address": address})
+        self._drop_acks(address)
+        self._schedule_reconnect(address)
+
+    def _schedule_reconnect(self, address: str):
+        if address in self._reconnecting:
+            return
+        self._reconnecting.add(address)
+        task = self._loop.create_task(self._reconnect(address))
+        self._reconnect_tasks.add(task)
+        task.add_done_callback(self._reconnect_tasks.discard)
+
+    async def _reconnect(self, address: str):
+        """Reconnect once, or until it succeeds if the address is pinned"""
+        delay = RECONNECT_BACKOFF_INITIAL
+        try:
+            while True:
+                try:
+                    await self.get_client(address)
+                    reconnects_total.inc("ok")
+                    return
+                except Exception as e:
+                    reconnects_total.inc("failed")
+                    self._clients.pop(address, None)
+                    if address not in self._pinned or self._closing:
+                        log.error("Reconnect to %s failed: %s", address, e, extra={"address": address})
+                        return
+                    log.warning("Reconnect to %s failed, retrying in %.1fs: %s", address, delay, e,
+                                extra={"address": address})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+        finally:
+            self._reconnecting.discard(address)
+
+    def pin(self, address: str):
+        """Keep address connected: keepalive while idle, backoff reconnects"""
+        self._pinned.add(address)
+
+    def unpin(self, address: str):
+        self._pinned.discard(address)
+
+    def is_pinned(self, address: str) -> bool:
+        return address in self._pinned
+
+    async def ping(self, address: str):
+        """
+        Zero-length write without response to the UART RX characteristic,
+        which puts a packet on an idle link without sending a frame. The
+        Generic Access service is hidden by BlueZ and CoreBluetooth, so the
+        UART service is the only thing we know the device exposes. Devices
+        that only take write requests are skipped.
+        """
+        client = self._clients.get(address)
+        try:
+            if client is None or not client.is_connected:
+                raise ConnectionError(f"Device {address} is not connected")
+            characteristic = client.services.get_characteristic(WRITE_CHAR_UUID)
+            if characteristic is None or "write-without-response" not in characteristic.properties:
+                keepalives_total.inc("skipped")
+                return
+            await client.write_gatt_char(characteristic, b"", response=False)
+            self._last_used[address] = time.monotonic()
+            keepalives_total.inc("ok")
+        except Exception as e:
+            keepalives_total.inc("failed")
+            log.warning("Keepalive to %s failed: %s", address, e, extra={"address": address})
+            await self.disconnect(address)
+            self._schedule_reconnect(address)
+
+    def start_keepalive(self, interval: float = KEEPALIVE_INTERVAL):
+        """Start the keepalive task for pinned links on the running loop"""
+        self._bind_loop()
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = self._loop.create_task(self._keepalive(interval))
+
+    async def stop_keepalive(self):
+        task, self._keepalive_task = self._keepalive_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _keepalive(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for address in list(self._pinned):
+                if address in self._reconnecting:
+                    continue
+                if not self.is_connected(address):
+                    self._schedule_reconnect(address)
+                elif now - self._last_used.get(address, 0.0) >= interval and not command_queues.is_busy(address):
+                    await self.ping(address)
+
+    async def disconnect(self, address: str):
+        self._drop_acks(address)
+        client = self._clients.pop(address, None)
+        if client is not None and client.is_connected:
+            try:
+                await client.disconnect()
+            except Exception as e:
+                log.warning("Error disconnecting %s: %s", address, e, extra={"address": address})
+
+    async def disconnect_all(self):
+        self._closing = True
+        try:
+            for address in list(self._clients):
+                await self.disconnect(address)
+        finally:
+            self._closing = False
+
+
+connection_manager = BLEConnectionManager()
+
+
+class DeviceBusyError(Exception):
+    """Raised when a command is rejected because its device is busy"""
+
+
+class CommandPreemptedError(Exception):
+    """Raised when a queued or running command is preempted by a newer one"""
+
+
+class DeviceChannel:
+    """
+    Serializes commands for one device through an asyncio.Queue drained
+    by a single worker task, so writes from concurrent requests never
+    interleave on the same link. Single frames queued back to back are
+    coalesced into one write when BLE_BATCH_WRITES is on.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self.queue = asyncio.Queue()
+        self.current = None
+        self._held = None
+        self._preempted = None
+        self._worker = None
+        self.processed = 0
+        self.rejected = 0
+        self.preempted = 0
+        self.batched = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    @property
+    def busy(self) -> bool:
+        return self.current is not None or self._held is not None or not self.queue.empty()
+
+    async def submit(self, factory, policy: str = None, frame: bytes = None):
+        """
+        Queue factory() to run on this device and return its result, or
+        with frame instead of a factory, write that frame and return its
+        acknowledgement RTT (see BLEConnectionManager.wait_for_ack).
+        policy decides what happens if the device is busy.
+        """
+        policy = policy or QUEUE_POLICY
+        if policy == "reject" and self.busy:
+            self.rejected += 1
+            raise DeviceBusyError(f"Device {self.address} is busy")
+        if policy == "preempt":
+            self.preempt()
+        
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((factory, future, time.monotonic(), frame))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._work())
+        return await future
+
+    def preempt(self):
+        """Drop every queued command and cancel the running one"""
+        held, self._held = self._held, None
+        queued = []
+        if held is not None:
+            queued.append(held)
+            self.queue.task_done()
+        while not self.queue.empty():
+            queued.append(self.queue.get_nowait())
+            self.queue.task_done()
+        for _, future, _, _ in queued:
+            if not future.done():
+                future.set_exception(CommandPreemptedError("Preempted by a newer command"))
+                self.preempted += 1
+        if self.current is not None and not self.current.done():
+            self._preempted = self.current
+            self.current.cancel()
+            self.preempted += 1
+
+    def _next_batch(self, first) -> list:
+        """first plus the frames queued right behind it, up to one write's worth"""
+        batch = [first]
+        capacity = connection_manager.frames_per_write(self.address) if BATCH_WRITES else 1
+        while len(batch) < capacity and not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item[3] is None:
+                # Not a frame: it runs on its own next
+                self._held = item
+                break
+            if item[1].done():
+                self.queue.task_done()
+                continue
+            batch.append(item)
+        return batch
+
+    async def _send_frames(self, frames):
+        ack = await connection_manager.write(self.address, b"".join(frames))
+        return await connection_manager.wait_for_ack(self.address, ack)
+
+    async def _work(self):
+        while True:
+            item, self._held = self._held, None
+            if item is None:
+                item = await self.queue.get()
+            batch = [item]
+            try:
+                if item[1].done():
+                    continue
+                if item[3] is not None:
+                    batch = self._next_batch(item)
+                futures = [future for _, future, _, _ in batch]
+                now = time.monotonic()
+                for _, _, enqueued_at, _ in batch:
+                    wait = now - enqueued_at
+                    self.last_wait = wait
+                    self.max_wait = max(self.max_wait, wait)
+                    self.total_wait += wait
+                
+                if item[3] is not None:
+                    coro = self._send_frames([frame for _, _, _, frame in batch])
+                    self.batched += len(batch) - 1
+                else:
+                    coro = item[0]()
+                task = asyncio.get_running_loop().create_task(coro)
+                self.current = task
+                # A caller that gives up (e.g. a cancelled job) stops its command
+                if len(futures) == 1:
+                    futures[0].add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+                await asyncio.wait({task})
+                self.processed += len(batch)
+                for future in futures:
+                    if future.done():
+                        continue
+                    if task.cancelled():
+                        if self._preempted is task:
+                            future.set_exception(CommandPreemptedError("Preempted by a newer command"))
+                        else:
+                            future.cancel()
+                    elif task.exception() is not None:
+                        future.set_exception(task.exception())
+                    else:
+                        future.set_result(task.result())
+            finally:
+                self.current = None
+                self._preempted = None
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "busy": self.busy,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "preempted": self.preempted,
+            "batched": self.batched,
+            "last_wait_ms": round(self.last_wait * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "mean_wait_ms": round(self.total_wait * 1000 / self.processed, 2) if self.processed else 0.0,
+        }
+
+
+class DeviceCommandQueues:
+    """One DeviceChannel per device address, created on first use"""
+
+    def __init__(self):
+        self._channels = {}
+
+    def channel(self, address: str) -> DeviceChannel:
+        channel = self._channels.get(address)
+        if channel is None:
+            channel = self._channels[address] = DeviceChannel(address)
+        return channel
+
+    async def submit(self, address: str, factory, policy: str = None):
+        return await self.channel(address).submit(factory, policy)
+
+    async def submit_frame(self, address: str, frame: bytes, policy: str = None):
+        """Write one frame through the device's queue; returns its ack RTT or None"""
+        return await self.channel(address).submit(None, policy, frame)
+
+    def is_busy(self, address: str) -> bool:
+        channel = self._channels.get(address)
+        return channel is not None and channel.busy
+
+    def stats(self) -> dict:
+        return {address: channel.stats() for address, channel in list(self._channels.items())}
+
+
+command_queues = DeviceCommandQueues()
+
+
+def _queue_error_result(error: Exception) -> dict:
+    if isinstance(error, DeviceBusyError):
+        return {"status": "error", "message": str(error), "busy": True}
+    return {"status": "error", "message": str(error), "preempted": True}
+
+
+class BackgroundEventLoop:
+    """
+    Runs a single asyncio event loop in a daemon thread. Flask handlers
+    submit coroutines to it so Bleak objects live on one loop for the
+    lifetime of the process instead of one loop per request.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(ready,), name="ble-event-loop", daemon=True
+            )
+            self._thread.start()
+            ready.wait()
+
+    def _run(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            # Let queue workers and playback jobs unwind before closing
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule coro on the loop and return a thread-safe future"""
+        if self.loop is None or not self.loop.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """Run coro on the loop and block the calling thread for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise asyncio.TimeoutError(f"BLE operation timed out after {timeout}s")
+
+    def stop(self):
+        with self._lock:
+            if self.loop is None or not self.loop.is_running():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(5.0)
+
+
+# Timeout for requests that send a single frame; sequences wait until done
+BLE_REQUEST_TIMEOUT = 60.0
+
+ble_loop = BackgroundEventLoop()
+
+
+def _advertised_name(device, advertisement_data):
+    return advertisement_data.local_name or device.name
+
+
+@dataclass
+class DeviceInfo:
+    """Latest advertisement seen from a matching device"""
+    address: str
+    name: str
+    rssi: int
+    last_seen: float
+    service_uuids: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        info = asdict(self)
+        info["age"] = round(time.monotonic() - self.last_seen, 3)
+        return info
+
+
+class DeviceRegistry:
+    """
+    Thread-safe registry of advertising devices keyed by address. The
+    scanner writes from the event loop thread, while Flask threads read.
+    Entries older than ttl seconds are treated as gone.
+    """
+
+    def __init__(self, ttl: float = DEVICE_TTL):
+        self.ttl = ttl
+        self._devices = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        self._last_expire = 0.0
+
+    def update(self, address: str, name: str, rssi: int, service_uuids=None) -> DeviceInfo:
+        now = time.monotonic()
+        info = DeviceInfo(address, name, rssi, now, list(service_uuids or []))
+        with self._lock:
+            # Re-insert so the dict stays ordered by last-seen
+            self._devices.pop(address, None)
+            self._devices[address] = info
+            self._names[name] = address
+            if now - self._last_expire > 1.0:
+                self._expire_locked(now)
+        return info
+
+    def get(self, address: str):
+        """Return the fresh entry for address, or None"""
+        with self._lock:
+            info = self._devices.get(address)
+            if info is None:
+                return None
+            if time.monotonic() - info.last_seen > self.ttl:
+                del self._devices[address]
+                return None
+            return info
+
+    def find_by_name(self, name: str):
+        """Return the fresh entry advertising exactly this name, or None"""
+        with self._lock:
+            address = self._names.get(name)
+        return self.get(address) if address else None
+
+    def strongest(self):
+        """Return the fresh entry with the highest RSSI, or None"""
+        with self._lock:
+            now = time.monotonic()
+            fresh = [info for info in self._devices.values() if now - info.last_seen <= self.ttl]
+        return max(fresh, key=lambda info: info.rssi, default=None)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            return list(self._devices.values())
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+            self._names.clear()
+
+    def _expire_locked(self, now: float):
+        self._last_expire = now
+        stale = [a for a, info in self._devices.items() if now - info.last_seen > self.ttl]
+        for address in stale:
+            info = self._devices.pop(address)
+            if self._names.get(info.name) == address:
+                del self._names[info.name]
+
+
+class AdvertisementScanner:
+    """
+    Feeds the device registry from BleakScanner detection callbacks.
+    Runs continuously in the background, or on demand until the first
+    matching advertisement arrives. A device matches on the name keyword,
+    the UART service UUID or the configured manufacturer data.
+    """
+
+    def __init__(self, registry: DeviceRegistry, keyword: str = DEVICE_NAME_KEYWORD):
+        self.registry = registry
+        self.keyword = keyword.lower()
+        self._scanner = None
+        self._waiters = []
+
+    @property
+    def running(self) -> bool:
+        return self._scanner is not None
+
+    def _matches(self, name: str, advertisement_data) -> bool:
+        if name and self.keyword in name.lower():
+            return True
+        if MATCH_SERVICE_UUID and UART_SERVICE_UUID in (u.lower() for u in advertisement_data.service_uuids or ()):
+            return True
+        if MANUFACTURER_ID is not None:
+            data = (advertisement_data.manufacturer_data or {}).get(MANUFACTURER_ID)
+            return data is not None and bytes(data).startswith(MANUFACTURER_PREFIX)
+        return False
+
+    def _on_detection(self, device, advertisement_data):
+        name = _advertised_name(device, advertisement_data)
+        if not self._matches(name, advertisement_data):
+            return
+        info = self.registry.update(
+            device.address, name or "Unknown", advertisement_data.rssi,
+            advertisement_data.service_uuids,
+        )
+        for predicate, waiter in list(self._waiters):
+            if not waiter.done() and (predicate is None or predicate(info)):
+                waiter.set_result(info)
+
+    async def start(self):
+        if self._scanner is not None:
+            return
+        scanner = BleakScanner(detection_callback=self._on_detection)
+        await scanner.start()
+        self._scanner = scanner
+
+    async def stop(self):
+        scanner, self._scanner = self._scanner, None
+        if scanner is not None:
+            await scanner.stop()
+
+    async def wait_for_device(self, timeout: float, predicate=None):
+        """
+        Return the first matching device seen within timeout, or None.
+        predicate, if given, is called with each DeviceInfo to narrow the match.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (predicate, waiter)
+        self._waiters.append(entry)
+        started_here = not self.running
+        try:
+            if started_here:
+                await self.start()
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            if started_here:
+                await self.stop()
+
+    async def find_strongest(self, timeout: float, settle: float = SCAN_SETTLE):
+        """
+        Return as soon as a matching device is seen, after listening settle
+        seconds more so the strongest of several nearby devices wins.
+        """
+        started_here = not self.running
+        if started_here:
+            await self.start()
+        try:
+            first = await self.wait_for_device(timeout)
+            if first is None:
+                return None
+            await asyncio.sleep(settle)
+            return self.registry.strongest() or first
+        finally:
+            if started_here:
+                await self.stop()
+
+
+device_registry = DeviceRegistry()
+advertisement_scanner = AdvertisementScanner(device_registry)
+
+
+async def start_background_scan():
+    try:
+        await advertisement_scanner.start()
+        log.info("📡 Background scan started for '%s' devices", DEVICE_NAME_KEYWORD)
+    except Exception as e:
+        log.warning("Background scan unavailable, scanning on demand: %s", e)
+
+
+async def close_ble():
+    """Stop scanning and drop every open link"""
+    await connection_manager.stop_keepalive()
+    try:
+        await advertisement_scanner.stop()
+    except Exception as e:
+        log.warning("Error stopping scanner: %s", e)
+    await connection_manager.disconnect_all()
+
+
+def shutdown_ble():
+    try:
+        ble_loop.run(close_ble(), timeout=5.0)
+    except Exception as e:
+        log.warning("Error closing BLE connections: %s", e)
+    ble_loop.stop()
+
+
+_started = False
+_start_lock = threading.Lock()
+
+def start():
+    """
+    Start the BLE event loop and the background scan. Only the process
+    that serves requests calls this (never the debug reloader's watcher,
+    nor HTTP workers forwarding to a daemon), so one scanner owns the
+    adapter. Safe to call more than once.
+    """
+    global _started
+    if BLE_DAEMON:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    ble_loop.start()
+    if BACKGROUND_SCAN:
+        ble_loop.submit(start_background_scan())
+    atexit.register(shutdown_ble)
 
-# Cache for device address to avoid scanning every time
-_cached_device_address = None
+async def scan_all(timeout: float = 5.0) -> list:
+    """Every advertising device seen within timeout, strongest first"""
+    seen = {}
+
+    def on_detection(device, advertisement_data):
+        seen[device.address] = {
+            "address": device.address,
+            "name": _advertised_name(device, advertisement_data),
+            "rssi": getattr(advertisement_data, "rssi", None),
+        }
+
+    scanner = BleakScanner(detection_callback=on_detection)
+    await scanner.start()
+    try:
+        await asyncio.sleep(timeout)
+    finally:
+        await scanner.stop()
+    return sorted(seen.values(), key=lambda d: d["rssi"] if d["rssi"] is not None else -999, reverse=True)
+
+async def _timed_scan(scan):
+    """Await a scan coroutine and record how long it took"""
+    started = time.monotonic()
+    found = await scan
+    scan_seconds.observe(time.monotonic() - started, "timeout" if found is None else "found")
+    return found
 
 async def find_device_by_name(keyword: str = DEVICE_NAME_KEYWORD, timeout: float = 10.0):
     """
-    Scan for BLE devices and find one with the keyword in its name.
+    Find a BLE device with the keyword in its name, or advertising the
+    UART service or configured manufacturer data.
+    Checks the open connection and the advertisement registry first, and
+    only scans when neither knows a device; the scan returns shortly after
+    the first match instead of waiting for the full timeout. When several
+    devices match, the one with the strongest RSSI is picked.
     Returns the device address if found, None otherwise.
     """
     global _cached_device_address
     
-    # If we have a cached address, verify it's still available
+    # If we have a cached address, verify it's still available. A recent
+    # advertisement counts as proof of life; otherwise the verification
+    # connect is kept open by the connection manager for the caller.
     if _cached_device_address:
+        started = time.monotonic()
+        if connection_manager.is_connected(_cached_device_address):
+            cache_verify_seconds.observe(time.monotonic() - started, "connected")
+            return _cached_device_address
+        if device_registry.get(_cached_device_address):
+            cache_verify_seconds.observe(time.monotonic() - started, "advertised")
+            return _cached_device_address
         try:
-            print(f"Checking cached device: {_cached_device_address}")
-            async with BleakClient(_cached_device_address, timeout=5.0) as client:
-                if client.is_connected:
-                    print(f"✅ Cached device still available")
-                    return _cached_device_address
+            log.info("Checking cached device: %s", _cached_device_address)
+            client = await connection_manager.get_client(_cached_device_address)
+            if client.is_connected:
+                cache_verify_seconds.observe(time.monotonic() - started, "connect")
+                log.info("✅ Cached device still available")
+                return _cached_device_address
         except Exception as e:
-            print(f"Cached device no longer available: {e}")
+            log.info("Cached device no longer available: %s", e)
             _cached_device_address = None
+        cache_verify_seconds.observe(time.monotonic() - started, "failed")
     
-    # Scan for devices
-    print(f"Scanning for devices with '{keyword}' in name...")
-    devices = await BleakScanner.discover(timeout=timeout)
+    info = None
+    if keyword.lower() == advertisement_scanner.keyword:
+        info = device_registry.strongest()
+        if info is None:
+            log.info("Scanning for devices with '%s' in name...", keyword)
+            info = await _timed_scan(advertisement_scanner.find_strongest(timeout))
+    else:
+        log.info("Scanning for devices with '%s' in name...", keyword)
+        device = await _timed_scan(BleakScanner.find_device_by_filter(
+            lambda d, adv: keyword.lower() in (_advertised_name(d, adv) or "").lower(),
+            timeout=timeout,
+        ))
+        if device is not None:
+            info = DeviceInfo(device.address, device.name or "Unknown", 0, time.monotonic())
     
-    for device in devices:
-        if device.name and keyword.lower() in device.name.lower():
-            print(f"✅ Found device: {device.name} ({device.address})")
-            _cached_device_address = device.address
-            return device.address
+    if info is not None:
+        log.info("✅ Found device: %s (%s)", info.name, info.address)
+        _cached_device_address = info.address
+        return info.address
     
-    print(f"❌ No device found with '{keyword}' in name")
+    log.warning("❌ No device found with '%s' in name", keyword)
     return None
 
-def crc16_modbus(data: bytes) -> bytes:
-    """Calculate CRC16 Modbus checksum"""
-    crc = 0xFFFF
-    for b in data:
-        crc ^= b
-        for _ in range(8):
-            if crc & 1:
-                crc = (crc >> 1) ^ 0xA001
-            else:
-                crc >>= 1
-    # Return in big-endian format to match the examples
-    return bytes([(crc >> 8) & 0xFF, crc & 0xFF])
-
-def build_scent_command(scent_id: int, duration_sec: int) -> bytes:
-    """Build scent command with correct CRC encoding"""
-    start = bytes([0xF5])
-    header = bytes([0x00, 0x00, 0x00, 0x01])
-    cmd_type = bytes([0x02])
-    subcmd = bytes([0x05])
-    channel = bytes([scent_id])
-    padding = bytes([0x00, 0x00])
-    
-    # Convert duration to milliseconds (2 bytes, big-endian)
-    duration_ms = duration_sec * 1000
-    duration_bytes = duration_ms.to_bytes(2, 'big')
+async def resolve_device(device: str = None):
+    """
+    Map a device alias, address or advertised name to an address.
+    Without a device, falls back to the first device found by keyword.
+    Returns None if the device cannot be found.
+    """
+    if not device:
+        return await find_device_by_name()
     
-    # Body for CRC calculation (everything except start, crc, and end)
-    body = header + cmd_type + subcmd + channel + padding + duration_bytes
+    address = DEVICE_ALIASES.get(device, device)
+    if connection_manager.is_connected(address) or device_registry.get(address):
+        return address
+    info = device_registry.find_by_name(device)
+    if info is not None:
+        return info.address
+    # Connected on an earlier run; let connect decide if it is still there
+    known = device_store.find_by_name(device) or (address if device_store.get(address) else None)
+    if known:
+        return known
     
-    # Calculate CRC
-    crc_bytes = crc16_modbus(body)
+    log.info("Scanning for device '%s'...", device)
+    info = await _timed_scan(advertisement_scanner.wait_for_device(
+        SCAN_TIMEOUT, lambda info: info.address == address or info.name == device
+    ))
+    if info is not None:
+        return info.address
+    if device in DEVICE_ALIASES:
+        # Configured devices may not advertise the keyword; let connect decide
+        return address
+    return None
+
+def _not_found_message(device: str = None) -> str:
+    if device:
+        return f"Device '{device}' not found. Make sure device is powered on and in range."
+    return f"Device with '{DEVICE_NAME_KEYWORD}' in name not found. Make sure device is powered on and in range."
+
+async def warm_up(devices=None):
+    """
+    Find and connect devices before the first request, pin their links so
+    they are kept alive and reconnected, and start the keepalive task.
+    Returns {device: address or None}.
+    """
+    devices = devices or WARMUP_DEVICES or list(DEVICE_ALIASES) or [None]
     
-    # End byte
-    end = bytes([0x55])
+    async def connect(device):
+        address = await resolve_device(device)
+        if not address:
+            raise LookupError(_not_found_message(device))
+        await connection_manager.get_client(address)
+        connection_manager.pin(address)
+        return address
     
-    # Complete command
-    return start + body + crc_bytes + end
+    results = {}
+    for device, result in zip(devices, await asyncio.gather(*(connect(d) for d in devices), return_exceptions=True)):
+        name = device or DEVICE_NAME_KEYWORD
+        if isinstance(result, BaseException):
+            log.warning("🔥 Warm-up of %s failed: %s", name, result)
+            results[name] = None
+        else:
+            log.info("🔥 Warmed up %s (%s)", name, result, extra={"address": result})
+            results[name] = result
+    connection_manager.start_keepalive(KEEPALIVE_INTERVAL)
+    return results
 
-async def play_scent_ble(scent_id: int, duration: int):
+async def play_scent_ble(scent_id: int, duration: int, device: str = None, policy: str = None):
     """Send a single scent command to the device"""
     try:
         # Find device dynamically
-        device_address = await find_device_by_name()
+        device_address = await resolve_device(device)
         if not device_address:
-            return {"status": "error", "message": f"Device with '{DEVICE_NAME_KEYWORD}' in name not found. Make sure device is powered on and in range."}
+            return {"status": "error", "message": _not_found_message(device)}
         
-        async with BleakClient(device_address) as client:
-            print(f"Connecting to device {device_address}...")
-            await client.connect()
-            
-            if not client.is_connected:
-                print("Failed to connect to device!")
-                return {"status": "error", "message": "Failed to connect to device"}
-            
-            print("Connected successfully!")
+        client = await connection_manager.get_client(device_address)
+        if not client.is_connected:
+            log.error("Failed to connect to device %s", device_address)
+            return {"status": "error", "message": "Failed to connect to device"}
+        
+        # Build command with correct CRC
+        cmd_bytes = _build_frame(scent_id, duration)
+        log.debug("Sending scent %d for %ds: %s", scent_id, duration, LazyHex(cmd_bytes))
+        
+        # Write to the characteristic through the device's command queue
+        rtt = await command_queues.submit_frame(device_address, cmd_bytes, policy)
+        scent_seconds_total.inc(scent_id, amount=duration)
+        log.info("Successfully sent scent %d for %ds", scent_id, duration,
+                 extra={"address": device_address, "scent_id": scent_id, "duration": duration})
+        
+        result = {"status": "success", "message": f"Scent {scent_id} sent for {duration} seconds", "address": device_address}
+        if connection_manager.supports_acks(device_address):
+            result["acknowledged"] = rtt is not None
+            if rtt is not None:
+                result["rtt_ms"] = round(rtt * 1000, 2)
+        return result
             
-            # Build command with correct CRC
-            cmd_bytes = build_scent_command(scent_id, duration)
-            print(f"Sending scent {scent_id} for {duration}s...")
-            print(f"Command bytes: {cmd_bytes.hex().upper()}")
+    except (DeviceBusyError, CommandPreemptedError) as e:
+        log.warning("Scent %d not sent: %s", scent_id, e)
+        return _queue_error_result(e)
+    except Exception as e:
+        log.error("Error sending scent: %s", e)
+        return {"status": "error", "message": str(e)}
+
+class DeadlineScheduler:
+    """
+    Paces sequence steps against absolute deadlines on the monotonic
+    clock, so write latency and logging in one step do not push back the
+    steps after it. Records how late each step landed.
+    """
+
+    def __init__(self, start: float = None):
+        self.start = time.monotonic() if start is None else start
+        self.lateness = []
+        self.rtts = []
+        self.resent = 0
+
+    async def wait_until(self, deadline: float, lead: float = 0.0):
+        """Sleep until lead seconds before deadline"""
+        delay = deadline - lead - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, deadline: float) -> float:
+        """Record that the step due at deadline has just landed"""
+        late = time.monotonic() - deadline
+        self.lateness.append(late)
+        sequence_lateness_seconds.observe(late)
+        return late
+
+    def record_ack(self, rtt: float):
+        self.rtts.append(rtt)
+
+    def report(self) -> dict:
+        lateness_ms = [round(late * 1000, 2) for late in self.lateness]
+        report = {
+            "lateness_ms": lateness_ms,
+            "max_lateness_ms": max(lateness_ms, default=0.0),
+            "mean_lateness_ms": round(sum(lateness_ms) / len(lateness_ms), 2) if lateness_ms else 0.0,
+        }
+        if self.rtts or self.resent:
+            report["acked"] = len(self.rtts)
+            report["resent"] = self.resent
+            report["mean_rtt_ms"] = round(sum(self.rtts) * 1000 / len(self.rtts), 2) if self.rtts else None
+        return report
+
+
+async def play_scent_fleet(scent_id: int, duration: int, devices, policy: str = None):
+    """Send the same scent to several devices concurrently"""
+    results = await asyncio.gather(*(play_scent_ble(scent_id, duration, device, policy) for device in devices))
+    ok = all(result["status"] == "success" for result in results)
+    return {
+        "status": "success" if ok else "error",
+        "message": f"Scent {scent_id} sent to {sum(r['status'] == 'success' for r in results)}/{len(results)} devices",
+        "devices": dict(zip(devices, results)),
+    }
+
+def _build_frame(scent_id: int, duration: int) -> bytes:
+    """build_scent_command, counting frames that fail to encode"""
+    try:
+        return build_scent_command(scent_id, duration)
+    except ValueError:
+        frame_errors_total.inc("encode")
+        raise
+
+def _prepare_steps(sequence):
+    """Pre-build (scent_id, duration, frame) for every step of a sequence"""
+    steps = []
+    for item in sequence:
+        scent_id = item.get('scent_id', item.get('id', 1))
+        duration = item.get('duration', 5)
+        steps.append((scent_id, duration, _build_frame(scent_id, duration)))
+    return steps
+
+async def _play_steps(device_address: str, steps, scheduler: DeadlineScheduler, job=None):
+    """
+    Write pre-built steps to one device on the scheduler's deadlines.
+    Each write is issued early by the device's measured lead time. On
+    devices that acknowledge, the next step is only released once the
+    previous one is acknowledged, and an unacknowledged frame is resent once.
+    """
+    lead = connection_manager.lead_time(device_address)
+    deadline = scheduler.start
+    for step, (scent_id, duration, cmd_bytes) in enumerate(steps):
+        if job is not None:
+            job.current_step = step
+        
+        try:
+            await scheduler.wait_until(deadline, lead)
+            log.debug("Sending scent %d for %ds: %s", scent_id, duration, LazyHex(cmd_bytes))
             
             # Write to the characteristic
-            await client.write_gatt_char(WRITE_CHAR_UUID, cmd_bytes)
-            print(f"Successfully sent scent {scent_id} for {duration}s")
+            ack = await connection_manager.write(device_address, cmd_bytes)
+            late = scheduler.record(deadline)
+            scent_seconds_total.inc(scent_id, amount=duration)
+            log.debug("Sent scent %d for %ds (%+.1f ms)", scent_id, duration, late * 1000,
+                      extra={"address": device_address, "scent_id": scent_id, "lateness": late})
             
-            return {"status": "success", "message": f"Scent {scent_id} sent for {duration} seconds"}
+            rtt = await connection_manager.wait_for_ack(device_address, ack, min(ACK_TIMEOUT, duration))
+            if rtt is not None:
+                scheduler.record_ack(rtt)
+            elif connection_manager.supports_acks(device_address):
+                log.warning("No acknowledgement for scent %d on %s, resending", scent_id, device_address,
+                            extra={"address": device_address, "scent_id": scent_id})
+                scheduler.resent += 1
+                ack = await connection_manager.write(device_address, cmd_bytes)
+                rtt = await connection_manager.wait_for_ack(device_address, ack, min(ACK_TIMEOUT, duration))
+                if rtt is not None:
+                    scheduler.record_ack(rtt)
+            lead = connection_manager.lead_time(device_address)
             
-    except Exception as e:
-        print(f"Error sending scent: {e}")
-        return {"status": "error", "message": str(e)}
+        except Exception as e:
+            log.error("Error sending scent %d: %s", scent_id, e, extra={"address": device_address})
+        
+        # Wait while scent plays
+        deadline += duration
+    
+    await scheduler.wait_until(deadline)
 
-async def play_sequence_ble(sequence):
-    """Send a sequence of scents to the device"""
+async def play_sequence_ble(sequence, job=None, device: str = None, policy: str = None):
+    """Send a sequence of scents to the device, reporting progress to job"""
     try:
         # Find device dynamically
-        device_address = await find_device_by_name()
+        device_address = await resolve_device(device)
         if not device_address:
-            return {"status": "error", "message": f"Device with '{DEVICE_NAME_KEYWORD}' in name not found. Make sure device is powered on and in range."}
+            return {"status": "error", "message": _not_found_message(device)}
+        if job is not None:
+            job.address = device_address
         
-        async with BleakClient(device_address) as client:
-            print(f"Connecting to device {device_address}...")
-            await client.connect()
-            
-            if not client.is_connected:
-                print("Failed to connect to device!")
-                return {"status": "error", "message": "Failed to connect to device"}
-            
-            print("Connected successfully!")
-            
-            for item in sequence:
-                scent_id = item.get('scent_id', item.get('id', 1))
-                duration = item.get('duration', 5)
-                
-                try:
-                    # Build command with correct CRC
-                    cmd_bytes = build_scent_command(scent_id, duration)
-                    print(f"Sending scent {scent_id} for {duration}s...")
-                    print(f"Command bytes: {cmd_bytes.hex().upper()}")
-                    
-                    # Write to the characteristic
-                    await client.write_gatt_char(WRITE_CHAR_UUID, cmd_bytes)
-                    print(f"Successfully sent scent {scent_id} for {duration}s")
-                    
-                    # Wait while scent plays
-                    await asyncio.sleep(duration)
-                    
-                except Exception as e:
-                    print(f"Error sending scent {scent_id}: {e}")
-                    continue
-            
-            return {"status": "success", "message": "Sequence completed"}
+        client = await connection_manager.get_client(device_address)
+        if not client.is_connected:
+            log.error("Failed to connect to device %s", device_address)
+            return {"status": "error", "message": "Failed to connect to device"}
+        
+        steps = _prepare_steps(sequence)
+        
+        async def play():
+            # Step deadlines are offsets from one start time, pushed back by
+            # the write latency so the first step also lands on time. The
+            # clock starts once the device's queue reaches this sequence.
+            scheduler = DeadlineScheduler(time.monotonic() + connection_manager.lead_time(device_address))
+            if job is not None:
+                job.mark_started()
+                job.scheduler = scheduler
+            await _play_steps(device_address, steps, scheduler, job)
+            return scheduler
+        
+        scheduler = await command_queues.submit(device_address, play, policy)
+        timing = scheduler.report()
+        log.info("Sequence of %d steps completed on %s (max lateness %.1f ms)",
+                 len(steps), device_address, timing["max_lateness_ms"], extra={"address": device_address})
+        return {"status": "success", "message": "Sequence completed", "address": device_address, "timing": timing}
             
+    except (DeviceBusyError, CommandPreemptedError) as e:
+        log.warning("Sequence not played: %s", e)
+        return _queue_error_result(e)
     except Exception as e:
-        print(f"Connection error: {e}")
+        log.error("Connection error: %s", e)
         return {"status": "error", "message": str(e)}
 
+class _StartBarrier:
+    """Hands out one shared start deadline once every device is ready"""
+
+    def __init__(self, parties: int, start_delay: float):
+        self.parties = parties
+        self.start_delay = start_delay
+        self.start = None
+        self._arrived = []
+        self._event = asyncio.Event()
+
+    async def wait(self, address: str):
+        """Return the shared start time, or None if the group was aborted"""
+        self._arrived.append(address)
+        if len(self._arrived) == self.parties:
+            # Leave enough headroom for the slowest link's lead time
+            lead = max(connection_manager.lead_time(a) for a in self._arrived)
+            self.start = time.monotonic() + max(self.start_delay, 2 * lead)
+            self._event.set()
+        await self._event.wait()
+        return self.start
+
+    def abort(self):
+        self._event.set()
+
+async def play_group_ble(sequence, devices, job=None, start_delay: float = GROUP_START_DELAY, policy: str = None):
+    """
+    Play one sequence on several devices in lockstep. All devices are
+    resolved and connected and all frames are built before anything is
+    sent; then every device is released against one shared start deadline.
+    Reports how far each device's first write landed from that deadline.
+    """
+    try:
+        addresses = await asyncio.gather(*(resolve_device(device) for device in devices))
+        missing = [device for device, address in zip(devices, addresses) if not address]
+        if missing:
+            return {"status": "error", "message": f"Devices not found: {', '.join(missing)}"}
+        if len(set(addresses)) != len(addresses):
+            return {"status": "error", "message": "Several selectors resolve to the same device"}
+        if job is not None:
+            job.address = list(addresses)
+        
+        await asyncio.gather(*(connection_manager.get_client(address) for address in addresses))
+        # A fresh link has no latency sample, so its first step would get no lead
+        await asyncio.gather(*(connection_manager.measure_lead(address) for address in addresses))
+        steps = _prepare_steps(sequence)
+        
+        # The start deadline is only fixed once every device's command
+        # queue has reached this sequence
+        barrier = _StartBarrier(len(addresses), start_delay)
+        schedulers = {}
+        if job is not None:
+            job.schedulers = schedulers
+        
+        async def play(address):
+            start = await barrier.wait(address)
+            if start is None:
+                return
+            if job is not None:
+                job.mark_started()
+            scheduler = schedulers[address] = DeadlineScheduler(start)
+            await _play_steps(address, steps, scheduler, job)
+        
+        async def play_queued(address):
+            try:
+                await command_queues.submit(address, lambda: play(address), policy)
+            except Exception:
+                barrier.abort()
+                raise
+        
+        results = await asyncio.gather(*(play_queued(address) for address in addresses), return_exceptions=True)
+        for result in results:
+            if isinstance(result, (DeviceBusyError, CommandPreemptedError)):
+                return _queue_error_result(result)
+            if isinstance(result, BaseException):
+                raise result
+        
+        report = _group_skew_report(schedulers)
+        return {
+            "status": "success",
+            "message": f"Sequence completed on {len(addresses)} devices",
+            "devices": dict(zip(devices, addresses)),
+            "timing": report,
+        }
+    except Exception as e:
+        log.error("Group playback error: %s", e)
+        return {"status": "error", "message": str(e)}
+
+def _group_skew_report(schedulers) -> dict:
+    """Per-device lateness plus start skew and per-step spread across devices"""
+    report = {address: scheduler.report() for address, scheduler in schedulers.items()}
+    starts = {
+        address: scheduler.lateness[0] * 1000
+        for address, scheduler in schedulers.items() if scheduler.lateness
+    }
+    for address, start_ms in starts.items():
+        report[address]["skew_ms"] = round(start_ms - min(starts.values()), 2)
+    steps = min((len(s.lateness) for s in schedulers.values()), default=0)
+    spread = [
+        round((max(s.lateness[i] for s in schedulers.values())
+               - min(s.lateness[i] for s in schedulers.values())) * 1000, 2)
+        for i in range(steps)
+    ]
+    return {"devices": report, "max_skew_ms": max(spread, default=0.0), "step_spread_ms": spread}
+
+class PlaybackJob:
+    """A queued or running sequence playback"""
+
+    def __init__(self, sequence, device=None, policy: str = None):
+        self.id = uuid.uuid4().hex
+        self.sequence = sequence
+        self.device = device
+        self.policy = policy
+        self.address = None
+        self.status = "queued"
+        self.message = "Sequence queued"
+        self.current_step = None
+        self.total_duration = sum(item.get('duration', 5) for item in sequence)
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.scheduler = None
+        self.schedulers = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled", "rejected", "preempted")
+
+    def mark_started(self):
+        """Called once the device's command queue reaches this job"""
+        if self.started_at is None:
+            self.status = "running"
+            self.message = "Sequence playing"
+            self.started_at = time.monotonic()
+
+    def _timing(self):
+        if self.schedulers:
+            return _group_skew_report(self.schedulers)
+        return self.scheduler.report() if self.scheduler else None
+
+    def to_dict(self) -> dict:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        remaining = 0.0 if self.done else max(0.0, self.total_duration - elapsed)
+        return {
+            "job_id": self.id,
+            "device": self.device,
+            "address": self.address,
+            "status": self.status,
+            "message": self.message,
+            "current_step": self.current_step,
+            "total_steps": len(self.sequence),
+            "elapsed": round(elapsed, 3),
+            "remaining": round(remaining, 3),
+            "total_duration": self.total_duration,
+            "timing": self._timing(),
+        }
+
+
+class PlaybackJobManager:
+    """
+    Runs sequence playback as tasks on the BLE event loop so HTTP
+    requests return at once. Finished jobs are kept for status lookups
+    until more than max_finished have accumulated.
+    """
+
+    def __init__(self, loop: BackgroundEventLoop, max_finished: int = 100):
+        self.loop = loop
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, sequence, device=None, policy: str = None) -> PlaybackJob:
+        """Queue sequence on one device, or in lockstep on a list of devices"""
+        job = PlaybackJob(sequence, device, policy)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_locked()
+        job.future = self.loop.submit(self._run(job))
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.future.cancel()
+        return job
+
+    async def _run(self, job: PlaybackJob):
+        # The job stays queued until a device queue reaches it; see mark_started
+        try:
+            if isinstance(job.device, list):
+                result = await play_group_ble(job.sequence, job.device, job, policy=job.policy)
+            else:
+                result = await play_sequence_ble(job.sequence, job, job.device, job.policy)
+            if result.get("busy"):
+                job.status = "rejected"
+            elif result.get("preempted"):
+                job.status = "preempted"
+            else:
+                job.status = "completed" if result["status"] == "success" else "failed"
+            job.message = result["message"]
+            return result
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.message = "Sequence cancelled"
+            raise
+        finally:
+            job.finished_at = time.monotonic()
+
+    def _on_done(self, job: PlaybackJob, future):
+        # A job cancelled before its task started never reaches _run
+        if future.cancelled() and not job.done:
+            job.status = "cancelled"
+            job.message = "Sequence cancelled"
+            job.finished_at = time.monotonic()
+
+    def _prune_locked(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+
+
+playback_jobs = PlaybackJobManager(ble_loop)
+
+def _parse_devices(value):
+    """
+    Normalise the optional "device" field to a list of device selectors.
+    Returns None if the value is malformed.
+    """
+    if value is None:
+        return [None]
+    if isinstance(value, str) and value:
+        return [value]
+    if isinstance(value, list) and value and all(isinstance(v, str) and v for v in value):
+        return list(dict.fromkeys(value))
+    return None
+
+def _parse_policy(value):
+    """Return the queue policy to use, or None if value is not a known policy"""
+    if value is None:
+        return QUEUE_POLICY
+    return value if value in QUEUE_POLICIES else None
+
+def _validate_scent(scent_id, duration, where: str = ""):
+    """Return an error message for an out-of-range scent_id or duration, or None"""
+    if not isinstance(scent_id, int) or scent_id < 1 or scent_id > 12:
+        return f"Invalid scent_id{where}. Must be between 1-12"
+    if not isinstance(duration, int) or duration < 1 or duration > 60:
+        return f"Invalid duration{where}. Must be between 1-60 seconds"
+    return None
+
+def _validate_sequence(sequence):
+    """Return an error message for a malformed sequence, or None"""
+    if not sequence:
+        return "No sequence provided"
+    if not isinstance(sequence, list):
+        return "Sequence must be a list"
+    
+    for i, item in enumerate(sequence):
+        if not isinstance(item, dict):
+            return f"Item {i} must be a dictionary"
+        
+        error = _validate_scent(item.get('scent_id', item.get('id', 1)), item.get('duration', 5), f" in item {i}")
+        if error:
+            return error
+    return None
+
+def _bad_request(message: str):
+    return {"status": "error", "message": message}, 400
+
+INVALID_DEVICE_MESSAGE = "Invalid device. Must be a name, alias, address or a list of them"
+INVALID_POLICY_MESSAGE = f"Invalid policy. Must be one of: {', '.join(QUEUE_POLICIES)}"
+
+# Commands run by whichever process owns the BLE adapter: this one, or
+# ble_daemon.py when BLE_DAEMON is set. Each returns (result, status).
+# They validate their own arguments, since daemon clients skip the routes.
+
+def command_ping():
+    return {"status": "ok", "message": "BLE daemon is running", "pid": os.getpid()}, 200
+
+def command_play_scent(scent_id: int, duration: int, devices=None, policy: str = None):
+    error = _validate_scent(scent_id, duration)
+    if error:
+        return _bad_request(error)
+    devices = _parse_devices(devices)
+    if devices is None:
+        return _bad_request(INVALID_DEVICE_MESSAGE)
+    policy = _parse_policy(policy)
+    if policy is None:
+        return _bad_request(INVALID_POLICY_MESSAGE)
+    if len(devices) == 1:
+        coro = play_scent_ble(scent_id, duration, devices[0], policy)
+    else:
+        coro = play_scent_fleet(scent_id, duration, devices, policy)
+    result = ble_loop.run(coro, timeout=BLE_REQUEST_TIMEOUT)
+    return result, 409 if result.get("busy") else 200
+
+def command_play_sequence(sequence, devices=None, policy: str = None, wait: bool = False):
+    error = _validate_sequence(sequence)
+    if error:
+        return _bad_request(error)
+    devices = _parse_devices(devices)
+    if devices is None:
+        return _bad_request(INVALID_DEVICE_MESSAGE)
+    policy = _parse_policy(policy)
+    if policy is None:
+        return _bad_request(INVALID_POLICY_MESSAGE)
+    # Each device gets its own job, and the jobs run concurrently
+    jobs = [playback_jobs.submit(sequence, device, policy) for device in devices]
+    if wait:
+        results = [job.future.result() for job in jobs]
+        if len(results) == 1:
+            return results[0], 200
+        ok = all(result["status"] == "success" for result in results)
+        return {
+            "status": "success" if ok else "error",
+            "message": "Sequence completed" if ok else "Sequence failed on some devices",
+            "devices": dict(zip(devices, results)),
+        }, 200
+    if len(jobs) == 1:
+        return {
+            "status": "success",
+            "message": "Sequence queued",
+            "job_id": jobs[0].id,
+            "job": jobs[0].to_dict(),
+        }, 202
+    return {
+        "status": "success",
+        "message": f"Sequence queued on {len(jobs)} devices",
+        "jobs": [job.to_dict() for job in jobs],
+    }, 202
+
+def command_play_group(sequence, devices, policy: str = None, wait: bool = False):
+    error = _validate_sequence(sequence)
+    if error:
+        return _bad_request(error)
+    devices = _parse_devices(devices)
+    if devices is None or devices == [None]:
+        return _bad_request("devices must be a non-empty list of names, aliases or addresses")
+    policy = _parse_policy(policy)
+    if policy is None:
+        return _bad_request(INVALID_POLICY_MESSAGE)
+    job = playback_jobs.submit(sequence, devices, policy)
+    if wait:
+        return job.future.result(), 200
+    return {
+        "status": "success",
+        "message": f"Group sequence queued on {len(devices)} devices",
+        "job_id": job.id,
+        "job": job.to_dict(),
+    }, 202
+
+def command_get_job(job_id: str):
+    job = playback_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown job {job_id}"}, 404
+    return job.to_dict(), 200
+
+def command_cancel_job(job_id: str):
+    job = playback_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown job {job_id}"}, 404
+    if job.done:
+        return {"status": "error", "message": f"Job already {job.status}", **job.to_dict()}, 409
+    playback_jobs.cancel(job_id)
+    return {"status": "success", "message": "Cancellation requested", "job_id": job_id}, 200
+
+def command_test_connection(device: str = None):
+    return ble_loop.run(test_ble_connection(device), timeout=BLE_REQUEST_TIMEOUT), 200
+
+def command_devices():
+    aliases = {address: alias for alias, address in DEVICE_ALIASES.items()}
+    devices = []
+    for info in device_registry.snapshot():
+        entry = info.to_dict()
+        entry["alias"] = aliases.get(info.address)
+        entry["connected"] = connection_manager.is_connected(info.address)
+        entry["pinned"] = connection_manager.is_pinned(info.address)
+        rtt = connection_manager.rtt(info.address)
+        entry["rtt_ms"] = round(rtt * 1000, 2) if rtt is not None else None
+        entry["mtu"] = connection_manager.mtu(info.address)
+        entry["write_mode"] = connection_manager.write_mode(info.address)
+        devices.append(entry)
+    return {
+        "status": "success",
+        "devices": devices,
+        "aliases": DEVICE_ALIASES,
+        "queues": command_queues.stats(),
+        "known": device_store.snapshot(),
+    }, 200
+
+def command_scan(timeout: float = 5.0):
+    devices = ble_loop.run(scan_all(timeout), timeout=timeout + BLE_REQUEST_TIMEOUT)
+    # Connected devices stop advertising; list them from the registry
+    seen = {device["address"] for device in devices}
+    for info in device_registry.snapshot():
+        if info.address not in seen and connection_manager.is_connected(info.address):
+            devices.append({"address": info.address, "name": info.name, "rssi": info.rssi, "connected": True})
+    return {"status": "success", "devices": devices}, 200
+
+def command_warm_up(devices=None):
+    warmed = ble_loop.run(warm_up(devices), timeout=BLE_REQUEST_TIMEOUT)
+    return {"status": "success", "devices": warmed}, 200
+
+def command_metrics():
+    return {"status": "success", "metrics": metrics.render()}, 200
+
+COMMANDS = {
+    "ping": command_ping,
+    "play_scent": command_play_scent,
+    "play_sequence": command_play_sequence,
+    "play_group": command_play_group,
+    "get_job": command_get_job,
+    "cancel_job": command_cancel_job,
+    "test_connection": command_test_connection,
+    "devices": command_devices,
+    "scan": command_scan,
+    "warm_up": command_warm_up,
+    "metrics": command_metrics,
+}
+
+def run_command(name: str, **params):
+    """Run a BLE command here, or on the daemon when BLE_DAEMON is set"""
+    if daemon_client is not None:
+        return daemon_client.request(name, **params)
+    return COMMANDS[name](**params)
+
+def _daemon_error_response(error: DaemonError):
+    return jsonify({"status": "error", "message": f"❌ {error}"}), 503
+
+@app.before_request
+def start_ble():
+    # WSGI servers import the app without running __main__
+    start()
+
+@app.errorhandler(DaemonError)
+def daemon_unavailable(error):
+    return _daemon_error_response(error)
+
 @app.route('/play_scent', methods=['POST'])
 def play_scent():
     """API endpoint to play a single scent"""
     try:
         data = request.get_json()
-        scent_id = data.get('scent_id', 1)
-        duration = data.get('duration', 5)
-        
-        # Validate input
-        if not isinstance(scent_id, int) or scent_id < 1 or scent_id > 12:
-            return jsonify({"status": "error", "message": "Invalid scent_id. Must be between 1-12"}), 400
         
-        if not isinstance(duration, int) or duration < 1 or duration > 60:
-            return jsonify({"status": "error", "message": "Invalid duration. Must be between 1-60 seconds"}), 400
-        
-        # Run the async function
-        result = asyncio.run(play_scent_ble(scent_id, duration))
-        return jsonify(result)
+        # Validated by the command, which runs on the shared BLE event loop
+        result, status = run_command("play_scent", scent_id=data.get('scent_id', 1), duration=data.get('duration', 5),
+                                     devices=data.get('device'), policy=data.get('policy'))
+        return jsonify(result), status
         
+    except DaemonError as e:
+        return _daemon_error_response(e)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -189,107 +1837,122 @@ def play_sequence():
     """API endpoint to play a sequence of scents"""
     try:
         data = request.get_json()
-        sequence = data.get('sequence', [])
         
-        if not sequence:
-            return jsonify({"status": "error", "message": "No sequence provided"}), 400
+        # Queue playback on the shared BLE event loop and return at once;
+        # callers that need the old blocking behaviour can pass "wait": true.
+        result, status = run_command("play_sequence", sequence=data.get('sequence', []), devices=data.get('device'),
+                                     policy=data.get('policy'), wait=bool(data.get('wait')))
+        return jsonify(result), status
         
-        # Validate sequence
-        for i, item in enumerate(sequence):
-            if not isinstance(item, dict):
-                return jsonify({"status": "error", "message": f"Item {i} must be a dictionary"}), 400
-            
-            scent_id = item.get('scent_id', item.get('id', 1))
-            duration = item.get('duration', 5)
-            
-            if not isinstance(scent_id, int) or scent_id < 1 or scent_id > 12:
-                return jsonify({"status": "error", "message": f"Invalid scent_id in item {i}. Must be between 1-12"}), 400
-            
-            if not isinstance(duration, int) or duration < 1 or duration > 60:
-                return jsonify({"status": "error", "message": f"Invalid duration in item {i}. Must be between 1-60 seconds"}), 400
+    except DaemonError as e:
+        return _daemon_error_response(e)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/play_group', methods=['POST'])
+def play_group():
+    """API endpoint to start one sequence on several devices at the same instant"""
+    try:
+        data = request.get_json()
         
-        # Run the async function
-        result = asyncio.run(play_sequence_ble(sequence))
-        return jsonify(result)
+        result, status = run_command("play_group", sequence=data.get('sequence', []), devices=data.get('devices'),
+                                     policy=data.get('policy'), wait=bool(data.get('wait')))
+        return jsonify(result), status
         
+    except DaemonError as e:
+        return _daemon_error_response(e)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report progress of a playback job"""
+    result, status = run_command("get_job", job_id=job_id)
+    return jsonify(result), status
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running playback job"""
+    result, status = run_command("cancel_job", job_id=job_id)
+    return jsonify(result), status
+
 @app.route('/test_connection', methods=['GET'])
 def test_connection():
     """Test BLE connection to the device"""
     try:
-        result = asyncio.run(test_ble_connection())
-        return jsonify(result)
+        device = request.args.get('device')
+        result, status = run_command("test_connection", device=device)
+        return jsonify(result), status
+    except DaemonError as e:
+        return _daemon_error_response(e)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-async def test_ble_connection():
+async def test_ble_connection(device: str = None):
     """Test if we can connect to the BLE device"""
     try:
         # Find device dynamically
-        print(f"Searching for device with '{DEVICE_NAME_KEYWORD}' in name...")
-        device_address = await find_device_by_name()
+        if device:
+            log.info("Searching for device '%s'...", device)
+        else:
+            log.info("Searching for device with '%s' in name...", DEVICE_NAME_KEYWORD)
+        device_address = await resolve_device(device)
         
         if not device_address:
             return {
                 "status": "error",
-                "message": f"Device with '{DEVICE_NAME_KEYWORD}' in name not found.\n\nPlease check:\n1. Device is powered ON\n2. Device is in range\n3. Device name contains '{DEVICE_NAME_KEYWORD}'\n4. Bluetooth is enabled on your computer",
-                "keyword": DEVICE_NAME_KEYWORD
+                "message": f"{_not_found_message(device).split('.')[0]}.\n\nPlease check:\n1. Device is powered ON\n2. Device is in range\n3. Device name contains '{DEVICE_NAME_KEYWORD}'\n4. Bluetooth is enabled on your computer",
+                "keyword": DEVICE_NAME_KEYWORD,
+                "device": device
             }
         
-        print(f"Testing connection to {device_address}...")
-        async with BleakClient(device_address, timeout=10.0) as client:
-            await client.connect()
+        log.info("Testing connection to %s...", device_address)
+        client = await connection_manager.get_client(device_address)
+        
+        if client.is_connected:
+            log.info("✅ Successfully connected!")
             
-            if client.is_connected:
-                print("✅ Successfully connected!")
-                
-                # Get device info from scan
-                device_name = "Unknown"
-                devices = await BleakScanner.discover(timeout=2.0)
-                for dev in devices:
-                    if dev.address == device_address:
-                        device_name = dev.name if dev.name else "Unknown"
-                        break
-                
-                # Try to check if write characteristic exists (using services property)
-                found_char = False
-                try:
-                    # In bleak, services are available as a property after connection
-                    if hasattr(client, 'services'):
-                        for service in client.services:
-                            for char in service.characteristics:
-                                if char.uuid.lower() == WRITE_CHAR_UUID.lower():
-                                    found_char = True
-                                    break
-                            if found_char:
+            # Get device info from the advertisement registry
+            info = device_registry.get(device_address)
+            device_name = info.name if info else "Unknown"
+            
+            # Try to check if write characteristic exists (using services property)
+            found_char = False
+            try:
+                # In bleak, services are available as a property after connection
+                if hasattr(client, 'services'):
+                    for service in client.services:
+                        for char in service.characteristics:
+                            if char.uuid.lower() == WRITE_CHAR_UUID.lower():
+                                found_char = True
                                 break
-                except Exception as e:
-                    print(f"Note: Could not enumerate services: {e}")
-                    # If we can't check services, assume it's okay since we connected
-                    found_char = True
-                
-                if found_char:
-                    return {
-                        "status": "success",
-                        "message": f"✅ Device connected successfully!\n\nDevice Name: {device_name}\nAddress: {device_address}\nWrite Characteristic: Available",
-                        "address": device_address,
-                        "device_name": device_name
-                    }
-                else:
-                    return {
-                        "status": "success",
-                        "message": f"✅ Connected to {device_name}!\n\nAddress: {device_address}\nNote: Could not verify write characteristic, but connection successful.",
-                        "address": device_address,
-                        "device_name": device_name
-                    }
+                        if found_char:
+                            break
+            except Exception as e:
+                log.info("Note: Could not enumerate services: %s", e)
+                # If we can't check services, assume it's okay since we connected
+                found_char = True
+            
+            if found_char:
+                return {
+                    "status": "success",
+                    "message": f"✅ Device connected successfully!\n\nDevice Name: {device_name}\nAddress: {device_address}\nWrite Characteristic: Available",
+                    "address": device_address,
+                    "device_name": device_name
+                }
             else:
                 return {
-                    "status": "error",
-                    "message": "Failed to connect to device",
-                    "address": device_address
+                    "status": "success",
+                    "message": f"✅ Connected to {device_name}!\n\nAddress: {device_address}\nNote: Could not verify write characteristic, but connection successful.",
+                    "address": device_address,
+                    "device_name": device_name
                 }
+        else:
+            return {
+                "status": "error",
+                "message": "Failed to connect to device",
+                "address": device_address
+            }
     except asyncio.TimeoutError:
         return {
             "status": "error",
@@ -312,6 +1975,18 @@ async def test_ble_connection():
                 "keyword": DEVICE_NAME_KEYWORD
             }
 
+@app.route('/devices', methods=['GET'])
+def list_devices():
+    """List advertising devices, configured aliases and open links"""
+    result, status = run_command("devices")
+    return jsonify(result), status
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of the BLE hot-path metrics"""
+    result, status = run_command("metrics")
+    return result["metrics"], status, {"Content-Type": MetricsRegistry.CONTENT_TYPE}
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -330,6 +2005,16 @@ if __name__ == "__main__":
     print(f"Characteristic UUID: {WRITE_CHAR_UUID}")
     print(f"Frontend URL: http://localhost:5001")
     print("=" * 60)
+    if BLE_DAEMON:
+        print(f"🔌 Forwarding BLE commands to the daemon at {BLE_DAEMON}")
+    # The debug reloader runs this block in a watcher process as well;
+    # only the process that serves requests should scan and hold BLE links
+    elif os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start()
+        if WARMUP:
+            print("🔥 Warming up BLE links before serving...")
+            warmed = ble_loop.run(warm_up(), timeout=BLE_REQUEST_TIMEOUT)
+            print(f"🔥 Connected {sum(1 for a in warmed.values() if a)}/{len(warmed)} devices")
     print("\n✅ Server starting...")
     print("📡 Device will be auto-discovered on first connection\n")
     app.run(debug=True, host='0.0.0.0', port=5001)
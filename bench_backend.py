@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Load test for the BLE HTTP backend.
+
+Serves backend.app over real HTTP against simulated devices from
+ble_simulator.py and drives it with N concurrent clients. Each client
+gets its own simulated device, so connect time and time-to-first-write
+can be attributed per request. Results are written as JSON so runs can
+be compared across commits:
+
+    python bench_backend.py --clients 8 --requests 20 --output bench_results.json
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Must be set before backend is imported
+os.environ["BLE_BACKEND"] = "simulator"
+os.environ["BLE_SIM_DEVICES"] = ""
+os.environ.setdefault("BLE_LOG_LEVEL", "ERROR")
+os.environ["BLE_DEVICE_STORE"] = ""
+
+import backend
+from ble_logging import configure_logging
+from ble_simulator import simulator
+from werkzeug.serving import make_server
+
+backend.start()
+
+
+def percentiles(values) -> dict:
+    """p50/p95/p99, mean and max of values in milliseconds (nearest rank)"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(v * 1000 for v in values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 3)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class BackendServer:
+    """backend.app on a local port in a background thread"""
+
+    def __init__(self):
+        self.server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+
+
+def call(url: str, method: str = "GET", body: dict = None):
+    """Issue one request; return (latency, start, response json or error)"""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as response:
+            result = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        result = json.loads(e.read() or b"{}")
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    return time.monotonic() - started, started, result
+
+
+def reset_backend(cold: bool):
+    """Forget connections and advertisements so the next request starts cold"""
+    if cold:
+        backend.ble_loop.run(backend.connection_manager.disconnect_all(), timeout=10)
+        backend.device_registry.clear()
+        backend._cached_device_address = None
+
+
+def drop_link(address: str):
+    """Close one device's link so its next request has to connect again"""
+    backend.ble_loop.run(backend.connection_manager.disconnect(address), timeout=10)
+
+
+def add_devices(count: int, prefix: str, **options):
+    # Close the previous scenario's links first, or they try to reconnect to removed devices
+    backend.ble_loop.run(backend.connection_manager.disconnect_all(), timeout=10)
+    simulator.reset()
+    return [simulator.add_device(f"{prefix}_{i}", **options) for i in range(count)]
+
+
+def run_scenario(server: BackendServer, name: str, endpoint: str, clients: int, requests: int,
+                 cold: bool, body=None, **device_options) -> dict:
+    devices = add_devices(clients, f"wear_{name}", **device_options)
+    reset_backend(cold)
+    if not cold:
+        # Warm every link and let the registry see every device
+        for device in devices:
+            call(server.url + "/play_scent", "POST", {"scent_id": 1, "duration": 1, "device": device.address})
+    for device in devices:
+        device.frames.clear()
+        device.connect_times.clear()
+
+    samples = []
+
+    def client(index: int):
+        device = devices[index]
+        for _ in range(requests):
+            if cold:
+                # Every request starts cold, not just the first one per client
+                drop_link(device.address)
+            if endpoint == "/test_connection":
+                latency, started, result = call(f"{server.url}{endpoint}?device={device.address}")
+            else:
+                payload = dict(body or {}, device=device.address)
+                latency, started, result = call(server.url + endpoint, "POST", payload)
+            samples.append((device, latency, started, result))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.monotonic() - started
+
+    latencies = [latency for _, latency, _, _ in samples]
+    errors = sum(result.get("status") != "success" for _, _, _, result in samples)
+    ttfw = []
+    for device, _, request_started, _ in samples:
+        first = next((frame.timestamp for frame in device.frames if frame.timestamp >= request_started), None)
+        if first is not None:
+            ttfw.append(first - request_started)
+    connects = [end - start for device in devices for start, end in device.connect_times]
+    frames = sum(len(device.frames) for device in devices)
+    return {
+        "endpoint": endpoint,
+        "clients": clients,
+        "requests": len(samples),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "latency_ms": percentiles(latencies),
+        "connect_ms": percentiles(connects),
+        "time_to_first_write_ms": percentiles(ttfw),
+        "frames_received": frames,
+        "frames_lost": sum(device.lost_frames for device in devices),
+        "connects": len(connects),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients (one simulated device each)")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client for single-shot endpoints")
+    parser.add_argument("--sequence-steps", type=int, default=4, help="1 s steps per sequence")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="simulated connect latency in seconds")
+    parser.add_argument("--write-latency", type=float, default=0.01, help="simulated write latency in seconds")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show backend output")
+    args = parser.parse_args()
+
+    if args.verbose:
+        configure_logging(level="INFO")
+    else:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    latency = {"connect_latency": args.connect_latency, "write_latency": args.write_latency}
+    sequence = [{"scent_id": (i % 12) + 1, "duration": 1} for i in range(args.sequence_steps)]
+    scenarios = [
+        ("play_scent_cold", "/play_scent", args.requests, True, {"scent_id": 3, "duration": 1}, {}),
+        ("play_scent_warm", "/play_scent", args.requests, False, {"scent_id": 3, "duration": 1}, {}),
+        ("test_connection_warm", "/test_connection", args.requests, False, None, {}),
+        ("play_sequence_warm", "/play_sequence", 1, False, {"sequence": sequence, "wait": True}, {}),
+        ("play_sequence_drop", "/play_sequence", 1, False, {"sequence": sequence, "wait": True},
+         {"drop_after_writes": max(1, args.sequence_steps // 2)}),
+    ]
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    print("=" * 70)
+    print(f"🏋️  BLE backend load test ({args.clients} clients, commit {results['commit']})")
+    print("=" * 70)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with BackendServer() as server:
+        for name, endpoint, requests, cold, body, options in scenarios:
+            with quiet:
+                stats = run_scenario(server, name, endpoint, args.clients, requests, cold, body, **latency, **options)
+            results["scenarios"][name] = stats
+            print(f"  {name:<22} {stats['throughput_rps']:8.2f} req/s  "
+                  f"p50 {stats['latency_ms'].get('p50', 0):9.1f} ms  "
+                  f"p99 {stats['latency_ms'].get('p99', 0):9.1f} ms  "
+                  f"ttfw p50 {stats['time_to_first_write_ms'].get('p50', 0):7.1f} ms  "
+                  f"errors {stats['errors']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("-" * 70)
+    print(f"📄 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
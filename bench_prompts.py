@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for building the AI backend's system prompts.
+
+Compares what every /compose and /feedback request used to do (a new Jinja
+Environment, template parse, palette json.dumps and schema dict) against the
+per-palette-version artifact cache in death_sentence/agents/openai_client.py.
+"""
+
+import argparse
+import json
+import timeit
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from death_sentence.agents import openai_client
+from death_sentence.agents.palette import palette_store
+from death_sentence.agents.settings import settings
+
+TEMPLATES = ("system_prompt.j2", "feedback_prompt.j2")
+
+
+def uncached(template_name: str, scents) -> tuple:
+    """The original per-request path"""
+    env = Environment(
+        loader=FileSystemLoader(settings.prompts_dir),
+        autoescape=select_autoescape(enabled_extensions=("j2",)),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    template = env.get_template(template_name)
+    prompt = template.render(scents_json=json.dumps(scents, ensure_ascii=False, indent=4))
+    return prompt, openai_client._SCHEMA_BUILDERS[template_name](scents)
+
+
+def bench(label: str, stmt, number: int) -> float:
+    seconds = min(timeit.repeat(stmt, number=number, repeat=3)) / number
+    print(f"  {label:<36} {seconds * 1e6:10.1f} µs/request")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=500, help="requests per timing run")
+    args = parser.parse_args()
+
+    palette = palette_store.get()
+    scents = palette.to_dict()
+    print("=" * 70)
+    print(f"⏱️  System prompt build benchmark (palette {palette.version}, {len(scents)} scents)")
+    print("=" * 70)
+    for template_name in TEMPLATES:
+        cached = openai_client.prompt_artifacts(template_name, palette)
+        assert (cached.system_prompt, cached.schema) == uncached(template_name, scents)
+        print(f"{template_name}:")
+        before = bench("new Environment + render + schema", lambda: uncached(template_name, scents), args.number)
+        after = bench("prompt_artifacts (cached)", lambda: openai_client.prompt_artifacts(template_name, palette),
+                      args.number)
+        print(f"  Saving per request: {(before - after) * 1e6:.1f} µs ({before / after:.0f}x)")
+    print("-" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for scent frame encoding.
+
+Compares the original bit-by-bit CRC and bytes concatenation against the
+table-driven encoder and the precompiled frame cache in protocol.py.
+"""
+
+import argparse
+import timeit
+
+from protocol import build_scent_command, encode_frame, encode_frames
+from test_protocol import reference_build_command
+
+COMMANDS = [(channel, duration) for channel in range(1, 13) for duration in range(1, 61)]
+
+
+def bench(label: str, stmt, number: int, frames_per_call: int = 1):
+    seconds = min(timeit.repeat(stmt, number=number, repeat=3))
+    rate = number * frames_per_call / seconds
+    print(f"  {label:<32} {seconds * 1e6 / (number * frames_per_call):8.3f} µs/frame  {rate:12,.0f} frames/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=20000, help="frames per timing run")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⏱️  Scent frame encoding benchmark")
+    print("=" * 70)
+    baseline = bench("bitwise CRC + bytes join", lambda: reference_build_command(7, 30), args.number)
+    bench("table CRC + struct.pack_into", lambda: encode_frame(7, 30), args.number)
+    cached = bench("build_scent_command (cache)", lambda: build_scent_command(7, 30), args.number)
+    batch = max(1, args.number // len(COMMANDS))
+    bench("encode_frames (720 per buffer)", lambda: encode_frames(COMMANDS), batch, len(COMMANDS))
+    print("-" * 70)
+    print(f"  Cache speedup over original: {cached / baseline:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
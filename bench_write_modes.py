@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Compare BLE write modes against the simulator.
+
+Runs the same workloads with write requests, write-without-response, and
+write-without-response plus batching (BLE_WRITE_MODE / BLE_BATCH_WRITES)
+on simulated devices with a large MTU, and reports per-command latency
+(call to frame received), burst throughput to one device, writes issued
+and frames lost. Results are written as JSON like bench_backend.py:
+
+    python bench_write_modes.py --commands 50 --burst 24 --output bench_results_write_modes.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+# Must be set before backend is imported
+os.environ["BLE_BACKEND"] = "simulator"
+os.environ["BLE_SIM_DEVICES"] = ""
+os.environ.setdefault("BLE_LOG_LEVEL", "ERROR")
+os.environ["BLE_DEVICE_STORE"] = ""
+
+import backend
+from ble_logging import configure_logging
+from ble_simulator import simulator
+from bench_backend import git_commit, percentiles
+
+MODES = {
+    "response": ("response", False),
+    "no_response": ("no-response", False),
+    "no_response_batched": ("no-response", True),
+}
+
+
+def use_mode(name: str):
+    """Switch write mode and drop every link so the next connect renegotiates"""
+    backend.WRITE_MODE, backend.BATCH_WRITES = MODES[name]
+    backend.ble_loop.run(backend.connection_manager.disconnect_all(), timeout=10)
+
+
+async def sequential(address: str, device, commands: int) -> list:
+    """Latency from submitting each frame to the device receiving it"""
+    latencies = []
+    for i in range(commands):
+        received = len(device.frames)
+        started = time.monotonic()
+        await backend.command_queues.submit_frame(address, backend._build_frame((i % 12) + 1, 1), "append")
+        if len(device.frames) > received:
+            latencies.append(device.frames[received].timestamp - started)
+    return latencies
+
+
+async def burst(address: str, size: int) -> float:
+    """Queue size frames at once; seconds until the last one is written"""
+    frames = [backend._build_frame((i % 12) + 1, 1) for i in range(size)]
+    started = time.monotonic()
+    await asyncio.gather(*(backend.command_queues.submit_frame(address, f, "append") for f in frames),
+                         return_exceptions=True)
+    return time.monotonic() - started
+
+
+def run_mode(name: str, args) -> dict:
+    use_mode(name)
+    simulator.reset()
+    device = simulator.add_device(f"wear_{name}", mtu=args.mtu, write_latency=args.write_latency,
+                                  packet_loss=args.packet_loss, no_response_loss=args.no_response_loss)
+    # Connect before timing anything
+    backend.ble_loop.run(backend.command_queues.submit_frame(device.address, backend._build_frame(1, 1)), timeout=10)
+    device.frames.clear()
+    device.lost_frames = 0
+    device.writes = 0
+
+    latencies = backend.ble_loop.run(sequential(device.address, device, args.commands), timeout=600)
+    burst_seconds = backend.ble_loop.run(burst(device.address, args.burst), timeout=600)
+    sent = args.commands + args.burst
+    return {
+        "write_mode": backend.connection_manager.write_mode(device.address),
+        "batched": backend.BATCH_WRITES,
+        "mtu": backend.connection_manager.mtu(device.address),
+        "command_latency_ms": percentiles(latencies),
+        "burst_seconds": round(burst_seconds, 3),
+        "burst_frames_per_second": round(args.burst / burst_seconds, 2) if burst_seconds else 0.0,
+        "frames_sent": sent,
+        "frames_received": len(device.frames),
+        "frames_lost": device.lost_frames,
+        "writes": device.writes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=50, help="sequential commands per mode")
+    parser.add_argument("--burst", type=int, default=24, help="frames queued at once per mode")
+    parser.add_argument("--mtu", type=int, default=247, help="simulated ATT MTU")
+    parser.add_argument("--write-latency", type=float, default=0.015, help="simulated write request latency in seconds")
+    parser.add_argument("--packet-loss", type=float, default=0.0, help="simulated loss for every write")
+    parser.add_argument("--no-response-loss", type=float, default=0.0, help="extra loss for writes without response")
+    parser.add_argument("--output", default="bench_results_write_modes.json", help="where to write the JSON results")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show backend output")
+    args = parser.parse_args()
+
+    if args.verbose:
+        configure_logging(level="INFO")
+    else:
+        logging.getLogger("backend").setLevel(logging.ERROR)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "modes": {},
+    }
+    print("=" * 70)
+    print(f"📶 BLE write modes (MTU {args.mtu}, commit {results['commit']})")
+    print("=" * 70)
+    for name in MODES:
+        stats = run_mode(name, args)
+        results["modes"][name] = stats
+        print(f"  {name:<20} p50 {stats['command_latency_ms'].get('p50', 0):7.1f} ms  "
+              f"burst {stats['burst_frames_per_second']:8.1f} frames/s  "
+              f"writes {stats['writes']:4d}  lost {stats['frames_lost']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("-" * 70)
+    print(f"📄 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
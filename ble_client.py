@@ -0,0 +1,102 @@
+"""
+Client for the BLE device daemon (ble_daemon.py).
+
+The daemon owns the Bluetooth adapter, open links and playback jobs.
+Anything else (the HTTP workers, scan_devices.py, ad-hoc scripts) sends
+it commands over a Unix socket or a local TCP port: one JSON object per
+line each way, {"command": ..., "params": {...}} answered by
+{"code": ..., "result": {...}}, where code is the HTTP status the
+backend would have returned.
+
+    from ble_client import DaemonClient
+    DaemonClient().call("play_scent", scent_id=3, duration=5)
+"""
+
+import json
+import os
+import select
+import socket
+import threading
+
+DEFAULT_ADDRESS = os.getenv("BLE_DAEMON_ADDRESS", "/tmp/deathscent_ble.sock")
+CONNECT_TIMEOUT = 5.0
+
+
+class DaemonError(Exception):
+    """The daemon could not be reached or broke the protocol"""
+
+
+def parse_address(address: str):
+    """
+    "host:port" is a TCP address, anything else a Unix socket path.
+    Returns (socket family, address) ready for socket.connect / bind.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and host and "/" not in address and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class DaemonClient:
+    """
+    Sends commands to the daemon. Each thread keeps its own connection
+    open between calls, so a threaded HTTP worker pays the connect once.
+    timeout bounds a single reply; None waits as long as the command runs
+    (sequences played with "wait" take their full duration).
+    """
+
+    def __init__(self, address: str = None, timeout: float = None):
+        self.address = address or DEFAULT_ADDRESS
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # An idle connection that is readable was closed by the daemon
+        if conn is not None and select.select([conn[0]], [], [], 0)[0]:
+            self.close()
+            conn = None
+        if conn is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(CONNECT_TIMEOUT)
+            try:
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                raise DaemonError(f"BLE daemon not reachable at {self.address}: {e}") from e
+            sock.settimeout(self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+        return conn
+
+    def request(self, command: str, **params):
+        """Run command on the daemon; returns (result dict, status code)"""
+        sock, reader = self._connection()
+        try:
+            sock.sendall(json.dumps({"command": command, "params": params}).encode() + b"\n")
+            line = reader.readline()
+        except OSError as e:
+            self.close()
+            raise DaemonError(f"Lost connection to BLE daemon at {self.address}: {e}") from e
+        if not line:
+            self.close()
+            raise DaemonError(f"BLE daemon at {self.address} closed the connection")
+        try:
+            reply = json.loads(line)
+            return reply["result"], reply["code"]
+        except (ValueError, KeyError, TypeError) as e:
+            self.close()
+            raise DaemonError(f"Malformed reply from BLE daemon: {e}") from e
+
+    def call(self, command: str, **params) -> dict:
+        """Run command on the daemon and return its result"""
+        return self.request(command, **params)[0]
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
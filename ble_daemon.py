@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+BLE device daemon.
+
+Owns the Bluetooth adapter, open links, command queues and playback
+jobs in one long-lived process, and serves the backend's BLE commands
+(see backend.COMMANDS) over a Unix socket or a local TCP port. The HTTP
+layer then holds no BLE state and can run under a multi-worker server:
+
+    python ble_daemon.py                              # /tmp/deathscent_ble.sock
+    BLE_DAEMON=1 gunicorn -w 4 -b 0.0.0.0:5001 backend:app
+
+Set BLE_DAEMON_ADDRESS (a socket path, or host:port for TCP) on both
+sides to move it. Scripts talk to it with ble_client.DaemonClient.
+"""
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+# The daemon owns the devices itself; it must never forward to a daemon
+os.environ.pop("BLE_DAEMON", None)
+
+import backend
+from ble_client import DEFAULT_ADDRESS, DaemonClient, DaemonError, parse_address
+
+log = logging.getLogger("ble_daemon")
+
+
+def handle_request(line: bytes) -> dict:
+    """Run one request line and build its reply"""
+    try:
+        request = json.loads(line)
+        command = backend.COMMANDS[request["command"]]
+        params = request.get("params") or {}
+    except (ValueError, KeyError, TypeError):
+        return {"code": 400, "result": {"status": "error", "message": f"Unknown or malformed command: {line[:100]!r}"}}
+    try:
+        # Only a mismatch with the command's signature is the caller's fault
+        inspect.signature(command).bind(**params)
+    except TypeError as e:
+        return {"code": 400, "result": {"status": "error", "message": f"Bad parameters for {request['command']}: {e}"}}
+    try:
+        result, code = command(**params)
+    except Exception as e:
+        log.exception("Command %s failed", request["command"])
+        return {"code": 500, "result": {"status": "error", "message": str(e)}}
+    return {"code": code, "result": result}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: any number of request lines, one reply each"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = handle_request(line)
+            try:
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+                self.wfile.flush()
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class BLEDaemon:
+    """Serves backend.COMMANDS at address, one thread per client connection"""
+
+    def __init__(self, address: str = None):
+        self.address = address or DEFAULT_ADDRESS
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            self._remove_stale_socket(bind_address)
+            self.server = _UnixServer(bind_address, _RequestHandler)
+            # Only this user may drive the devices
+            os.chmod(bind_address, 0o600)
+        else:
+            self.server = _TCPServer(bind_address, _RequestHandler)
+        self._thread = None
+
+    def _remove_stale_socket(self, path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            DaemonClient(path, timeout=1.0).call("ping")
+        except DaemonError:
+            os.unlink(path)
+        else:
+            raise RuntimeError(f"A BLE daemon is already running at {path}")
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        """Serve from a background thread (for tests and embedding)"""
+        backend.start()
+        self._thread = threading.Thread(target=self.serve_forever, name="ble-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server.address_family == socket.AF_UNIX:
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path or host:port to listen on")
+    parser.add_argument("--warmup", action="store_true", default=backend.WARMUP,
+                        help="connect and pin BLE_WARMUP_DEVICES before serving")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🌹 DeathScent BLE Daemon 🌹")
+    print("=" * 60)
+    try:
+        daemon = BLEDaemon(args.address)
+    except (OSError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+    backend.start()
+    if args.warmup:
+        print("🔥 Warming up BLE links before serving...")
+        warmed = backend.ble_loop.run(backend.warm_up(), timeout=backend.BLE_REQUEST_TIMEOUT)
+        print(f"🔥 Connected {sum(1 for a in warmed.values() if a)}/{len(warmed)} devices")
+    # Treat a service stop like Ctrl+C so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"✅ Listening on {daemon.address}")
+    print(f"📡 Run the HTTP backend with BLE_DAEMON={daemon.address} to forward to this daemon\n")
+    try:
+        daemon.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        print("\n🛑 Shutting down")
+    finally:
+        daemon.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Logging setup for the BLE backend.
+
+Records are put on an in-memory queue by the thread that logs them and
+written out by a listener thread, so a slow or piped stdout never stalls
+the BLE event loop. Messages use %-style arguments, which are only
+formatted by the listener and only for records that pass the level
+check; wrap bytes in LazyHex to get the same for hex dumps.
+
+Configured from the environment:
+
+    BLE_LOG_LEVEL=INFO                          default level
+    BLE_LOG_LEVELS=backend=DEBUG,werkzeug=ERROR per-module overrides
+    BLE_LOG_FORMAT=text                         or json, one object per line
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_handler = None
+
+
+class LazyHex:
+    """Formats bytes as upper-case hex only when a record is emitted"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __str__(self):
+        return self.data.hex().upper()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed via extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler formats each record on the logging thread before queuing
+    it. Our arguments are immutable (ints, strings, bytes), so formatting
+    is left to the listener thread instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, _, level = entry.partition("=")
+        if level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: str = None, levels: str = None, fmt: str = None):
+    """
+    Route logging through a background queue listener. Safe to call more
+    than once; only the first call installs handlers, later calls only
+    update levels.
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    root.setLevel((level or os.getenv("BLE_LOG_LEVEL", "INFO")).upper())
+    for name, module_level in _parse_levels(levels if levels is not None else os.getenv("BLE_LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(module_level)
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if (fmt or os.getenv("BLE_LOG_FORMAT", "text")).lower() == "json":
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+    records = queue.SimpleQueue()
+    _handler = _DeferredQueueHandler(records)
+    root.addHandler(_handler)
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _handler
+    listener, _listener = _listener, None
+    if listener is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+        listener.stop()
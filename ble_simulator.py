@@ -0,0 +1,388 @@
+"""
+Simulated scent necklaces for running backend.py without Bluetooth.
+
+SimulatedBleakScanner and SimulatedBleakClient mirror the parts of the
+Bleak API the backend uses, and talk to in-memory SimulatedPeripheral
+objects instead of an adapter. Every write to the UART RX characteristic
+is decoded, CRC-checked and recorded with a monotonic timestamp. Connect
+and write latency, disconnects and packet loss can be injected per device.
+
+Run the backend against the simulator with:
+
+    BLE_BACKEND=simulator BLE_SIM_DEVICES=wear_sim_1,wear_sim_2 python backend.py
+"""
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+from protocol import FRAME_SIZE, decode_frame
+
+WRITE_CHAR_UUID = "6e400002-b5a3-f393-e0a9-e50e24dcca9e"
+NOTIFY_CHAR_UUID = "6e400003-b5a3-f393-e0a9-e50e24dcca9e"
+UART_SERVICE_UUID = "6e400001-b5a3-f393-e0a9-e50e24dcca9e"
+# A write without response skips the ATT response, roughly the second
+# half of a write request's round trip
+NO_RESPONSE_LATENCY_FACTOR = 0.5
+
+
+@dataclass
+class ReceivedFrame:
+    """A frame that reached a simulated device"""
+    timestamp: float
+    raw: bytes
+    channel: int = None
+    duration_ms: int = None
+    crc_ok: bool = False
+
+
+@dataclass
+class SimulatedPeripheral:
+    """
+    One simulated necklace. Latencies are in seconds; packet_loss and
+    disconnect_rate are per-write probabilities. drop_after_writes forces
+    a disconnect after that many writes on a single connection.
+    no_response_loss is extra loss for writes without response, which have
+    no link-layer confirmation that the peripheral accepted them. With ack
+    set, every received frame is echoed back on the UART TX characteristic
+    after ack_latency; drop_acks withholds that many of the next echoes.
+    """
+    address: str
+    name: str
+    rssi: int = -55
+    connect_latency: float = 0.05
+    write_latency: float = 0.01
+    packet_loss: float = 0.0
+    disconnect_rate: float = 0.0
+    drop_after_writes: int = None
+    advertise_interval: float = 0.1
+    ack: bool = False
+    ack_latency: float = 0.005
+    drop_acks: int = 0
+    mtu: int = 23
+    no_response_loss: float = 0.0
+    writes: int = 0
+    frames: list = field(default_factory=list)
+    lost_frames: int = 0
+    connects: int = 0
+    disconnects: int = 0
+    pings: int = 0
+    connect_times: list = field(default_factory=list)
+    connected_client: object = None
+
+    def receive(self, data: bytes) -> ReceivedFrame:
+        """Record one write, which may carry several frames; returns the last"""
+        now = time.monotonic()
+        data = bytes(data)
+        chunks = [data]
+        if len(data) > FRAME_SIZE and len(data) % FRAME_SIZE == 0:
+            chunks = [data[i:i + FRAME_SIZE] for i in range(0, len(data), FRAME_SIZE)]
+        for chunk in chunks:
+            frame = ReceivedFrame(now, chunk)
+            try:
+                frame.channel, frame.duration_ms, frame.crc_ok = decode_frame(frame.raw)
+            except ValueError:
+                pass
+            self.frames.append(frame)
+        return frame
+
+
+class BLESimulator:
+    """The set of simulated devices currently in range"""
+
+    def __init__(self, seed: int = None):
+        self.devices = {}
+        self.random = random.Random(seed)
+        self._next_id = 1
+
+    def add_device(self, name: str, address: str = None, **options) -> SimulatedPeripheral:
+        if address is None:
+            address = "SIM:%02X:%02X" % divmod(self._next_id, 256)
+            self._next_id += 1
+        device = SimulatedPeripheral(address, name, **options)
+        self.devices[address] = device
+        return device
+
+    def remove_device(self, address: str):
+        device = self.devices.pop(address, None)
+        if device is not None and device.connected_client is not None:
+            device.connected_client._drop()
+
+    def reset(self):
+        for address in list(self.devices):
+            self.remove_device(address)
+
+    def get(self, address: str) -> SimulatedPeripheral:
+        return self.devices.get(address)
+
+    def from_env(self):
+        """Create devices listed in BLE_SIM_DEVICES (default: one wear_sim)"""
+        names = os.getenv("BLE_SIM_DEVICES", "wear_sim").split(",")
+        options = {
+            "connect_latency": float(os.getenv("BLE_SIM_CONNECT_LATENCY", "0.05")),
+            "write_latency": float(os.getenv("BLE_SIM_WRITE_LATENCY", "0.01")),
+            "packet_loss": float(os.getenv("BLE_SIM_PACKET_LOSS", "0")),
+            "disconnect_rate": float(os.getenv("BLE_SIM_DISCONNECT_RATE", "0")),
+            "mtu": int(os.getenv("BLE_SIM_MTU", "23")),
+        }
+        for name in filter(None, (n.strip() for n in names)):
+            self.add_device(name, **options)
+        return self
+
+
+simulator = BLESimulator()
+
+
+@dataclass
+class SimulatedDevice:
+    """Stand-in for bleak.backends.device.BLEDevice"""
+    address: str
+    name: str
+
+
+@dataclass
+class SimulatedAdvertisementData:
+    """Stand-in for bleak.backends.scanner.AdvertisementData"""
+    local_name: str
+    rssi: int
+    service_uuids: list = field(default_factory=lambda: [UART_SERVICE_UUID])
+    manufacturer_data: dict = field(default_factory=dict)
+    service_data: dict = field(default_factory=dict)
+    tx_power: int = None
+    platform_data: tuple = ()
+
+
+def _advertisement(device: SimulatedPeripheral):
+    return SimulatedDevice(device.address, device.name), SimulatedAdvertisementData(device.name, device.rssi)
+
+
+class SimulatedBleakScanner:
+    """Delivers advertisements from the simulator to detection callbacks"""
+
+    def __init__(self, detection_callback=None, service_uuids=None, **kwargs):
+        self._callback = detection_callback
+        self._service_uuids = [u.lower() for u in service_uuids or []]
+        self._task = None
+        self.discovered = {}
+
+    def _matches(self, advertisement_data) -> bool:
+        if not self._service_uuids:
+            return True
+        return any(u in self._service_uuids for u in advertisement_data.service_uuids)
+
+    async def _advertise(self):
+        # Each device advertises on its own interval, starting at a random phase
+        next_due = {a: simulator.random.uniform(0, d.advertise_interval) for a, d in simulator.devices.items()}
+        started = time.monotonic()
+        while True:
+            now = time.monotonic() - started
+            for address, device in list(simulator.devices.items()):
+                due = next_due.setdefault(address, now)
+                if now < due or device.connected_client is not None:
+                    continue
+                next_due[address] = now + device.advertise_interval
+                ble_device, advertisement_data = _advertisement(device)
+                if not self._matches(advertisement_data):
+                    continue
+                self.discovered[address] = (ble_device, advertisement_data)
+                if self._callback is not None:
+                    self._callback(ble_device, advertisement_data)
+            await asyncio.sleep(0.01)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._advertise())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def discovered_devices(self):
+        return [device for device, _ in self.discovered.values()]
+
+    @classmethod
+    async def discover(cls, timeout: float = 5.0, **kwargs):
+        scanner = cls(**kwargs)
+        await scanner.start()
+        await asyncio.sleep(timeout)
+        await scanner.stop()
+        return scanner.discovered_devices
+
+    @classmethod
+    async def find_device_by_filter(cls, filterfunc, timeout: float = 10.0, **kwargs):
+        found = asyncio.get_running_loop().create_future()
+
+        def on_detection(device, advertisement_data):
+            if not found.done() and filterfunc(device, advertisement_data):
+                found.set_result(device)
+
+        scanner = cls(detection_callback=on_detection, **kwargs)
+        await scanner.start()
+        try:
+            return await asyncio.wait_for(found, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            await scanner.stop()
+
+
+@dataclass
+class _Characteristic:
+    uuid: str
+    properties: list
+    handle: int = 0
+
+
+@dataclass
+class _Service:
+    uuid: str
+    characteristics: list
+
+
+class _Services(list):
+    """Stand-in for BleakGATTServiceCollection"""
+
+    def get_characteristic(self, uuid: str):
+        uuid = str(uuid).lower()
+        for service in self:
+            for characteristic in service.characteristics:
+                if characteristic.uuid == uuid:
+                    return characteristic
+        return None
+
+
+class SimulatedBleakClient:
+    """Connects to a SimulatedPeripheral with the BleakClient interface"""
+
+    def __init__(self, address_or_ble_device, disconnected_callback=None, services=None, *, timeout: float = 10.0, **kwargs):
+        self.address = getattr(address_or_ble_device, "address", address_or_ble_device)
+        self._disconnected_callback = disconnected_callback
+        self._timeout = timeout
+        self._device = None
+        self._loop = None
+        self._writes = 0
+        self._notify_callbacks = {}
+        self.mtu_size = 23
+        self.services = _Services([
+            _Service(UART_SERVICE_UUID, [
+                _Characteristic(WRITE_CHAR_UUID, ["write", "write-without-response"], 14),
+                _Characteristic(NOTIFY_CHAR_UUID, ["notify"], 16),
+            ]),
+        ])
+
+    @property
+    def is_connected(self) -> bool:
+        return self._device is not None
+
+    @property
+    def name(self) -> str:
+        device = simulator.get(self.address)
+        return device.name if device else None
+
+    async def connect(self, **kwargs) -> bool:
+        device = simulator.get(self.address)
+        if device is None:
+            await asyncio.sleep(min(self._timeout, 0.1))
+            raise Exception(f"Device with address {self.address} was not found")
+        if device.connected_client is not None and device.connected_client is not self:
+            raise Exception(f"[org.bluez.Error.InProgress] Device {self.address} is busy")
+        if device.connect_latency > self._timeout:
+            await asyncio.sleep(self._timeout)
+            raise asyncio.TimeoutError()
+        started = time.monotonic()
+        await asyncio.sleep(device.connect_latency)
+        device.connected_client = self
+        device.connects += 1
+        self._loop = asyncio.get_running_loop()
+        device.connect_times.append((started, time.monotonic()))
+        self.mtu_size = device.mtu
+        self._device = device
+        self._writes = 0
+        return True
+
+    async def disconnect(self) -> bool:
+        self._notify_callbacks.clear()
+        device, self._device = self._device, None
+        if device is not None and device.connected_client is self:
+            device.connected_client = None
+        return True
+
+    def _drop(self):
+        """Simulate the peripheral going away"""
+        self._notify_callbacks.clear()
+        device, self._device = self._device, None
+        if device is None:
+            return
+        device.connected_client = None
+        device.disconnects += 1
+        if self._disconnected_callback is not None:
+            # Devices may be removed from another thread, e.g. by a test
+            self._loop.call_soon_threadsafe(self._disconnected_callback, self)
+
+    async def write_gatt_char(self, char_specifier, data, response: bool = None):
+        device = self._device
+        if device is None:
+            raise Exception("Not connected")
+        uuid = getattr(char_specifier, "uuid", char_specifier)
+        if str(uuid).lower() != WRITE_CHAR_UUID:
+            raise Exception(f"Characteristic {uuid} not found")
+        if len(data) > self.mtu_size - 3:
+            raise Exception(f"[ATT 0x0d] Invalid attribute value length {len(data)} for MTU {self.mtu_size}")
+        # Bleak defaults to a write request unless told otherwise
+        with_response = response is None or response
+        await asyncio.sleep(device.write_latency * (1 if with_response else NO_RESPONSE_LATENCY_FACTOR))
+        if self._device is not device:
+            raise Exception("Disconnected during write")
+        if not data:
+            # Empty writes carry no frame; the necklace ignores them
+            device.pings += 1
+            return
+        device.writes += 1
+
+        loss = device.packet_loss if with_response else device.packet_loss + device.no_response_loss
+        if simulator.random.random() < loss:
+            device.lost_frames += max(1, len(data) // FRAME_SIZE)
+        else:
+            device.receive(data)
+            callback = self._notify_callbacks.get(NOTIFY_CHAR_UUID)
+            if device.ack and device.drop_acks > 0:
+                device.drop_acks -= 1
+            elif device.ack and callback is not None:
+                characteristic = self.services.get_characteristic(NOTIFY_CHAR_UUID)
+                self._loop.call_later(device.ack_latency, self._notify, callback, characteristic, bytearray(data))
+        self._writes += 1
+
+        if (device.drop_after_writes is not None and self._writes >= device.drop_after_writes) \
+                or simulator.random.random() < device.disconnect_rate:
+            self._drop()
+
+    def _notify(self, callback, characteristic, data: bytearray):
+        # Notifications stop once the link is gone
+        if self._device is not None:
+            callback(characteristic, data)
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        uuid = str(getattr(char_specifier, "uuid", char_specifier)).lower()
+        if self._device is None:
+            raise Exception("Not connected")
+        if uuid != NOTIFY_CHAR_UUID:
+            raise Exception(f"Characteristic {uuid} does not notify")
+        self._notify_callbacks[uuid] = callback
+
+    async def stop_notify(self, char_specifier):
+        self._notify_callbacks.pop(str(getattr(char_specifier, "uuid", char_specifier)).lower(), None)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
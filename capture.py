@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Append-only capture log of the frames the backend writes, plus offline
+replay.
+
+A capture file starts with a magic line and then holds fixed-header
+records:
+
+    kind (1 byte) | monotonic timestamp (float64) | address length (uint16)
+    | payload length (uint16) | address (utf-8) | payload
+
+kind 1 is a frame written to a device. kind 2 marks the start of a
+backend session; its payload is the wall-clock time (float64), so the
+monotonic timestamps that follow can be placed in real time.
+
+    python capture.py dump field.cap
+    python capture.py replay field.cap --device AA:BB:CC:DD:EE:FF
+    python capture.py replay field.cap --simulator --fast
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from protocol import decode_frame
+
+MAGIC = b"DSCAPTURE1\n"
+RECORD_FRAME = 1
+RECORD_SESSION = 2
+
+_RECORD = struct.Struct(">BdHH")
+_WALL_TIME = struct.Struct(">d")
+
+
+@dataclass
+class CapturedFrame:
+    """One frame read back from a capture file"""
+    timestamp: float
+    address: str
+    frame: bytes
+    wall_time: float = None
+    session: int = 0
+
+
+class CaptureLog:
+    """
+    Appends every written frame to a binary file. record() only puts the
+    frame on an in-memory queue, so it is safe to call from any thread,
+    including the BLE event loop; a writer thread encodes the records and
+    flushes whenever the queue runs dry. close() writes out everything
+    still queued.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if new_file:
+            self._file.write(MAGIC)
+        self._records = queue.SimpleQueue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_records, name="capture-writer", daemon=True)
+        self._writer.start()
+        self._append(RECORD_SESSION, time.monotonic(), "", _WALL_TIME.pack(time.time()))
+        atexit.register(self.close)
+
+    def _append(self, kind: int, timestamp: float, address: str, payload: bytes):
+        self._records.put((kind, timestamp, address, payload))
+
+    def _write_records(self):
+        while True:
+            item = self._records.get()
+            if item is None:
+                break
+            kind, timestamp, address, payload = item
+            encoded = address.encode("utf-8")
+            self._file.write(_RECORD.pack(kind, timestamp, len(encoded), len(payload)) + encoded + payload)
+            if self._records.empty():
+                self._file.flush()
+        self._file.flush()
+
+    def record(self, address: str, frame: bytes, timestamp: float = None):
+        self._append(RECORD_FRAME, time.monotonic() if timestamp is None else timestamp, address, bytes(frame))
+
+    def close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._records.put(None)
+        self._writer.join()
+        self._file.close()
+
+
+def read_capture(path: str):
+    """Yield CapturedFrame for every frame record in a capture file"""
+    wall_time = None
+    session_start = None
+    session = 0
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            kind, timestamp, address_len, payload_len = _RECORD.unpack(header)
+            address = f.read(address_len).decode("utf-8")
+            payload = f.read(payload_len)
+            if len(payload) < payload_len:
+                # Truncated final record from a crash
+                return
+            if kind == RECORD_SESSION:
+                (wall_time,) = _WALL_TIME.unpack(payload)
+                session_start = timestamp
+                session += 1
+            elif kind == RECORD_FRAME:
+                frame_wall_time = None
+                if wall_time is not None:
+                    frame_wall_time = wall_time + (timestamp - session_start)
+                yield CapturedFrame(timestamp, address, payload, frame_wall_time, session)
+
+
+def dump(path: str):
+    for captured in read_capture(path):
+        try:
+            channel, duration_ms, crc_ok = decode_frame(captured.frame)
+            decoded = f"scent {channel:2d} for {duration_ms:5d} ms  CRC {'ok' if crc_ok else 'BAD'}"
+        except ValueError as e:
+            decoded = f"undecodable: {e}"
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(captured.wall_time)) if captured.wall_time else "?"
+        print(f"{when}  {captured.timestamp:14.3f}  {captured.address:<38} {captured.frame.hex().upper()}  {decoded}")
+
+
+async def replay(path: str, device: str = None, fast: bool = False, client_class=None,
+                 write_char_uuid: str = "6e400002-b5a3-f393-e0a9-e50e24dcca9e"):
+    """
+    Re-send the frames in a capture. With fast=False, frames keep their
+    original spacing within each backend session, and sessions are played
+    back to back (each one's monotonic clock has its own origin); with
+    fast=True they are sent back to back. device overrides every captured
+    address.
+    Returns a list of (address, frame, lateness_seconds).
+    """
+    if client_class is None:
+        from bleak import BleakClient as client_class
+    frames = list(read_capture(path))
+    clients = {}
+    sent = []
+    try:
+        for address in dict.fromkeys(device or captured.address for captured in frames):
+            client = client_class(address)
+            await client.connect()
+            clients[address] = client
+
+        start = time.monotonic()
+        offset = 0.0
+        session = session_first = None
+        for captured in frames:
+            address = device or captured.address
+            if captured.session != session:
+                # Rebase: the new session starts where the previous one ended
+                session, session_first = captured.session, captured.timestamp
+                base = offset
+            offset = base + (captured.timestamp - session_first)
+            deadline = start + offset
+            if not fast:
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await clients[address].write_gatt_char(write_char_uuid, captured.frame)
+            sent.append((address, captured.frame, time.monotonic() - deadline))
+        return sent
+    finally:
+        for client in clients.values():
+            await client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    dump_parser = commands.add_parser("dump", help="decode and print a capture")
+    dump_parser.add_argument("path")
+    replay_parser = commands.add_parser("replay", help="re-send a capture to a device")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--device", help="send every frame to this address instead of the captured ones")
+    replay_parser.add_argument("--fast", action="store_true", help="send frames back to back, ignoring timing")
+    replay_parser.add_argument("--simulator", action="store_true", help="replay into ble_simulator devices")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        dump(args.path)
+        return 0
+
+    client_class = None
+    if args.simulator:
+        from ble_simulator import SimulatedBleakClient as client_class, simulator
+        for address in dict.fromkeys(args.device or c.address for c in read_capture(args.path)):
+            simulator.add_device(f"replay_{address}", address=address, connect_latency=0.0, write_latency=0.0)
+    sent = asyncio.run(replay(args.path, args.device, args.fast, client_class))
+    late = [lateness * 1000 for _, _, lateness in sent]
+    print(f"✅ Replayed {len(sent)} frames")
+    if late and not args.fast:
+        print(f"   Lateness: max {max(late):.1f} ms, mean {sum(late) / len(late):.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,81 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
-from typing import Dict, Any
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Mapping, TypeVar
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 
 from .schemas import ComposeRequest, ComposeResponse, FeedbackRequest, FeedbackResponse
 from .settings import settings
-from .openai_client import compose_with_openai, refine_with_openai, transcribe_audio
+from .openai_client import (
+    OpenAIBusyError,
+    close_client,
+    compose_with_openai,
+    refine_with_openai,
+    transcribe_audio,
+    warm_up_client,
+)
+from .palette import Palette, palette_store
+from .composition_cache import composition_cache, composition_key
+
+
+PALETTE_VERSION_HEADER = "X-Palette-Version"
+# HIT-memory, HIT-sqlite, MISS or BYPASS
+CACHE_HEADER = "X-Composition-Cache"
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
 
+T = TypeVar("T")
 
-def load_scents() -> Dict[str, Any]:
-    path: Path = settings.scents_path
-    if not path.exists():
-        raise FileNotFoundError(f"Scents JSON not found at {path}")
-    with path.open("r", encoding="utf-8") as f:
-        all_scents = json.load(f)
-    # Only include scents with device locations 1-12
-    return {
-        name: info for name, info in all_scents.items()
-        if 1 <= int(info.get("location", 0)) <= 12
-    }
 
+def load_palette() -> Palette:
+    """Current palette snapshot; only re-read when the scents file changes."""
+    try:
+        return palette_store.get()
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def load_scents() -> Mapping[str, Any]:
+    # Only scents with device locations 1-12 (see palette.filter_scents)
+    return palette_store.get().scents
+
+
+async def until_disconnected(http_request: Request, call: Awaitable[T]) -> T:
+    """Await call, cancelling it (and its OpenAI request) if the client goes away."""
+    task = asyncio.ensure_future(call)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        task.cancel()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # One pooled OpenAI client for the app's lifetime, connected before the first request
+    await warm_up_client()
+    try:
+        yield
+    finally:
+        await close_client()
 
-app = FastAPI(title="Etherea Scent Composer")
+
+app = FastAPI(title="Etherea Scent Composer", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[PALETTE_VERSION_HEADER, CACHE_HEADER],
 )
 
 
@@ -41,43 +84,72 @@ def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/palette")
+def palette() -> Dict[str, Any]:
+    current = load_palette()
+    return {"version": current.version, "scents": current.to_dict()}
+
+
+@app.get("/cache")
+def cache_stats() -> Dict[str, Any]:
+    return composition_cache.stats()
+
+
 @app.post("/compose", response_model=ComposeResponse)
-def compose(request: ComposeRequest) -> ComposeResponse:
-    try:
-        scents = load_scents()
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def compose(request: ComposeRequest, response: Response, http_request: Request) -> ComposeResponse:
+    current = load_palette()
+    response.headers[PALETTE_VERSION_HEADER] = current.version
 
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
 
+    key = composition_key(request.sentence, settings.openai_model, current.version)
+    if not composition_cache.enabled:
+        response.headers[CACHE_HEADER] = "OFF"
+    elif request.bypass_cache:
+        composition_cache.record_bypass()
+        response.headers[CACHE_HEADER] = "BYPASS"
+    else:
+        cached, tier = await composition_cache.get(key)
+        if cached is not None:
+            response.headers[CACHE_HEADER] = f"HIT-{tier}"
+            return cached
+        response.headers[CACHE_HEADER] = "MISS"
+
     try:
-        result = compose_with_openai(request.sentence, scents)
-        return result
+        result = await until_disconnected(http_request, compose_with_openai(request.sentence, current))
+    except OpenAIBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         # Surface errors for debugging; in production, sanitize
         raise HTTPException(status_code=422, detail=str(e))
+    if result is not None and composition_cache.enabled:
+        await composition_cache.put(key, result)
+    return result
 
 
 @app.post("/feedback", response_model=FeedbackResponse)
-def feedback(request: FeedbackRequest) -> FeedbackResponse:
-    try:
-        scents = load_scents()
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def feedback(request: FeedbackRequest, response: Response, http_request: Request) -> FeedbackResponse:
+    current = load_palette()
+    response.headers[PALETTE_VERSION_HEADER] = current.version
 
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
 
     try:
-        result = refine_with_openai(request, scents)
-        return result
+        return await until_disconnected(http_request, refine_with_openai(request, current))
+    except OpenAIBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
 
 @app.post("/transcribe")
-async def transcribe(audio: UploadFile = File(...)) -> Dict[str, str]:
+async def transcribe(http_request: Request, audio: UploadFile = File(...)) -> Dict[str, str]:
     """Transcribe audio using OpenAI Whisper."""
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
@@ -85,8 +157,12 @@ async def transcribe(audio: UploadFile = File(...)) -> Dict[str, str]:
         raise HTTPException(status_code=400, detail="Expected an audio file")
     try:
         content = await audio.read()
-        text = transcribe_audio(content, audio.filename or "audio.webm")
+        text = await until_disconnected(http_request, transcribe_audio(content, audio.filename or "audio.webm"))
         return {"text": text}
+    except OpenAIBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .schemas import ComposeResponse
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+# Trailing/leading punctuation that does not change what a sentence asks for
+_EDGE_PUNCTUATION = " \t.,;:!?…'\"“”‘’"
+
+
+def normalize_sentence(sentence: str) -> str:
+    """Case, width, whitespace and edge punctuation folded away."""
+    text = unicodedata.normalize("NFKC", sentence).casefold()
+    return _WHITESPACE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+def composition_key(sentence: str, model: str, palette_version: str) -> str:
+    raw = "\0".join((model, palette_version, normalize_sentence(sentence)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompositionCache:
+    """
+    /compose results keyed on composition_key(). The first tier is an
+    in-process LRU with a TTL. The optional second tier is a SQLite file,
+    which survives restarts and is shared by every uvicorn worker that
+    points at it. Entries are stored as JSON and parsed on every hit, so
+    callers never share a response object.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 86400.0, sqlite_path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sqlite_path = Path(sqlite_path) if sqlite_path else None
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stores = 0
+        self.counters: Dict[str, int] = {"memory_hits": 0, "sqlite_hits": 0, "misses": 0, "bypassed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.sqlite_path is not None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    async def get(self, key: str) -> Tuple[Optional[ComposeResponse], Optional[str]]:
+        """Cached response and the tier it came from ("memory" or "sqlite"), or (None, None)."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is not None:
+            self._count("memory_hits")
+            return ComposeResponse.model_validate_json(entry[1]), "memory"
+        if self.sqlite_path is not None:
+            row = await asyncio.to_thread(self._sqlite_get, key, now)
+            if row is not None:
+                self._remember(key, row[0], row[1])
+                self._count("sqlite_hits")
+                return ComposeResponse.model_validate_json(row[1]), "sqlite"
+        self._count("misses")
+        return None, None
+
+    async def put(self, key: str, response: ComposeResponse) -> None:
+        expires_at = time.time() + self.ttl
+        value = response.model_dump_json()
+        self._remember(key, expires_at, value)
+        if self.sqlite_path is not None:
+            try:
+                await asyncio.to_thread(self._sqlite_put, key, expires_at, value)
+            except sqlite3.Error as e:
+                log.warning("Could not store composition in %s: %s", self.sqlite_path, e)
+
+    def record_bypass(self) -> None:
+        self._count("bypassed")
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-process tier (the SQLite file is left alone)."""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._memory)
+        hits = counters["memory_hits"] + counters["sqlite_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": entries,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "sqlite": str(self.sqlite_path) if self.sqlite_path else None,
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections belong to the thread that opened them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, timeout=5.0)
+            # WAL lets workers read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS compositions "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _sqlite_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        try:
+            return self._connection().execute(
+                "SELECT expires_at, value FROM compositions WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log.warning("Could not read composition cache %s: %s", self.sqlite_path, e)
+            return None
+
+    def _sqlite_put(self, key: str, expires_at: float, value: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO compositions (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._stores += 1
+            # Expired rows are only ever skipped on read; sweep them now and then
+            if self._stores % 100 == 0:
+                conn.execute("DELETE FROM compositions WHERE expires_at <= ?", (time.time(),))
+
+
+composition_cache = CompositionCache(
+    max_entries=settings.compose_cache_size,
+    ttl=settings.compose_cache_ttl,
+    sqlite_path=settings.compose_cache_db,
+)
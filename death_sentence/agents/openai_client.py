@@ -1,38 +1,135 @@
 from __future__ import annotations
 
+import asyncio
 import io
 import json
-from typing import Any, Dict, List
+import logging
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple
 
+import httpx
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
 
+from .palette import Palette
 from .schemas import ComposeResponse, FeedbackRequest, FeedbackResponse, ScentItem
 from .settings import settings
 
+log = logging.getLogger(__name__)
 
-def transcribe_audio(audio_bytes: bytes, filename: str = "audio.webm") -> str:
+_client: Optional[AsyncOpenAI] = None
+_client_lock = threading.Lock()
+_slots: Optional[asyncio.Semaphore] = None
+
+
+class OpenAIBusyError(Exception):
+    """Every OpenAI request slot stayed taken for openai_queue_timeout seconds."""
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Process-wide async OpenAI client, created on first use. Its connection
+    pool keeps TLS connections alive between requests instead of paying a
+    new handshake per call.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                limits = httpx.Limits(
+                    max_connections=settings.openai_max_connections,
+                    max_keepalive_connections=settings.openai_max_keepalive,
+                    keepalive_expiry=settings.openai_keepalive_expiry,
+                )
+                _client = AsyncOpenAI(
+                    api_key=settings.openai_api_key,
+                    max_retries=settings.openai_max_retries,
+                    timeout=Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout),
+                    http_client=DefaultAsyncHttpxClient(limits=limits),
+                )
+    return _client
+
+
+async def warm_up_client() -> None:
+    """Create the client and open a pooled connection before the first request."""
+    # Without a key the routes refuse requests, so there is nothing to warm
+    if not settings.openai_api_key:
+        return
+    client = get_client()
+    if not settings.openai_warmup:
+        return
+    try:
+        await client.with_options(max_retries=0, timeout=settings.openai_connect_timeout).models.retrieve(
+            settings.openai_model
+        )
+    except Exception as e:
+        log.warning("OpenAI warm-up failed, connecting on first request: %s", e)
+
+
+async def close_client() -> None:
+    """Close the shared client's connection pool (app shutdown)."""
+    global _client, _slots
+    with _client_lock:
+        client, _client = _client, None
+        _slots = None
+    if client is not None:
+        await client.close()
+
+
+@asynccontextmanager
+async def request_slot() -> AsyncIterator[None]:
+    """
+    Hold one of openai_max_concurrency slots for an OpenAI call. Callers
+    beyond that wait up to openai_queue_timeout seconds, then get
+    OpenAIBusyError instead of piling more requests onto the pool.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.openai_max_concurrency)
+    slots = _slots
+    try:
+        await asyncio.wait_for(slots.acquire(), settings.openai_queue_timeout)
+    except asyncio.TimeoutError:
+        raise OpenAIBusyError(
+            f"All {settings.openai_max_concurrency} OpenAI request slots busy for {settings.openai_queue_timeout}s"
+        )
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+async def transcribe_audio(audio_bytes: bytes, filename: str = "audio.webm") -> str:
     """Transcribe audio using OpenAI Whisper API."""
-    client = OpenAI(api_key=settings.openai_api_key)
+    client = get_client()
     file_like = io.BytesIO(audio_bytes)
     file_like.name = filename
-    response = client.audio.transcriptions.create(model="whisper-1", file=file_like)
+    async with request_slot():
+        response = await client.audio.transcriptions.create(model="whisper-1", file=file_like)
     return response.text
 
 
-def _render_prompt(template_name: str, scents: Dict[str, Any]) -> str:
-    env = Environment(
-        loader=FileSystemLoader(settings.prompts_dir),
-        autoescape=select_autoescape(enabled_extensions=("j2",)),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    template = env.get_template(template_name)
-    scents_json = json.dumps(scents, ensure_ascii=False, indent=4)
+# One environment for the process: Jinja caches compiled templates and
+# recompiles one when its file changes (auto_reload)
+_jinja_env = Environment(
+    loader=FileSystemLoader(settings.prompts_dir),
+    autoescape=select_autoescape(enabled_extensions=("j2",)),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=True,
+)
+
+
+def _render_prompt(template_name: str, scents: Mapping[str, Any]) -> str:
+    template = _jinja_env.get_template(template_name)
+    # Palette snapshots are read-only mappings; default=dict serializes them
+    scents_json = json.dumps(scents, ensure_ascii=False, indent=4, default=dict)
     return template.render(scents_json=scents_json)
 
 
-def _build_schema(scents: Dict[str, Any]) -> Dict[str, Any]:
+def _build_schema(scents: Mapping[str, Any]) -> Dict[str, Any]:
     # Kept for reference if switching back to json_schema; not used by parse()
     scent_names = list(scents.keys())
     return {
@@ -58,13 +155,52 @@ def _build_schema(scents: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def compose_with_openai(sentence: str, scents: Dict[str, Any]) -> ComposeResponse:
-    system_prompt = _render_prompt("system_prompt.j2", scents)
-    client = OpenAI(api_key=settings.openai_api_key)
+@dataclass(frozen=True)
+class PromptArtifacts:
+    """Rendered system prompt and json_schema fallback for one palette version."""
+
+    system_prompt: str
+    schema: Dict[str, Any]  # shared between requests; treat as read-only
+
+
+_artifacts: Dict[Tuple[str, str, int], PromptArtifacts] = {}
+_artifacts_lock = threading.Lock()
+
+
+def prompt_artifacts(template_name: str, palette: Palette) -> PromptArtifacts:
+    """
+    Prompt and schema for template_name rendered against palette, cached on
+    (template name, palette version, template mtime). Only the newest entry
+    per template is kept, so an edited template or palette replaces it.
+    """
+    mtime_ns = (settings.prompts_dir / template_name).stat().st_mtime_ns
+    key = (template_name, palette.version, mtime_ns)
+    artifacts = _artifacts.get(key)
+    if artifacts is None:
+        artifacts = PromptArtifacts(
+            system_prompt=_render_prompt(template_name, palette.scents),
+            schema=_SCHEMA_BUILDERS[template_name](palette.scents),
+        )
+        with _artifacts_lock:
+            for stale in [k for k in _artifacts if k[0] == template_name]:
+                del _artifacts[stale]
+            _artifacts[key] = artifacts
+    return artifacts
+
+
+async def compose_with_openai(sentence: str, palette: Palette) -> ComposeResponse:
+    async with request_slot():
+        return await _compose(sentence, palette)
+
+
+async def _compose(sentence: str, palette: Palette) -> ComposeResponse:
+    artifacts = prompt_artifacts("system_prompt.j2", palette)
+    system_prompt = artifacts.system_prompt
+    client = get_client()
 
     # Use Responses API structured parsing into a Pydantic model
     try:
-        response = client.responses.parse(
+        response = await client.responses.parse(
             model=settings.openai_model,
             input=[
                 {"role": "system", "content": system_prompt},
@@ -85,8 +221,8 @@ def compose_with_openai(sentence: str, scents: Dict[str, Any]) -> ComposeRespons
             return ComposeResponse.model_validate_json(response.output_text)
     except Exception:
         # Fall back to a json_schema flow for older SDKs
-        schema = _build_schema(scents)
-        legacy = client.responses.create(
+        schema = artifacts.schema
+        legacy = await client.responses.create(
             model=settings.openai_model,
             instructions=system_prompt,
             input=sentence,
@@ -137,7 +273,7 @@ def _build_feedback_user_message(request: FeedbackRequest) -> str:
     )
 
 
-def _build_feedback_schema(scents: Dict[str, Any]) -> Dict[str, Any]:
+def _build_feedback_schema(scents: Mapping[str, Any]) -> Dict[str, Any]:
     """JSON schema for feedback response (includes changes_made)."""
     scent_names = list(scents.keys())
     return {
@@ -164,14 +300,27 @@ def _build_feedback_schema(scents: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def refine_with_openai(request: FeedbackRequest, scents: Dict[str, Any]) -> FeedbackResponse:
+# json_schema fallback built alongside each system prompt
+_SCHEMA_BUILDERS: Dict[str, Callable[[Mapping[str, Any]], Dict[str, Any]]] = {
+    "system_prompt.j2": _build_schema,
+    "feedback_prompt.j2": _build_feedback_schema,
+}
+
+
+async def refine_with_openai(request: FeedbackRequest, palette: Palette) -> FeedbackResponse:
     """Refine an existing scent composition based on user feedback."""
-    system_prompt = _render_prompt("feedback_prompt.j2", scents)
+    async with request_slot():
+        return await _refine(request, palette)
+
+
+async def _refine(request: FeedbackRequest, palette: Palette) -> FeedbackResponse:
+    artifacts = prompt_artifacts("feedback_prompt.j2", palette)
+    system_prompt = artifacts.system_prompt
     user_message = _build_feedback_user_message(request)
-    client = OpenAI(api_key=settings.openai_api_key)
+    client = get_client()
 
     try:
-        response = client.responses.parse(
+        response = await client.responses.parse(
             model=settings.openai_model,
             input=[
                 {"role": "system", "content": system_prompt},
@@ -188,8 +337,8 @@ def refine_with_openai(request: FeedbackRequest, scents: Dict[str, Any]) -> Feed
         if hasattr(response, "output_text") and response.output_text:
             return FeedbackResponse.model_validate_json(response.output_text)
     except Exception:
-        schema = _build_feedback_schema(scents)
-        legacy = client.responses.create(
+        schema = artifacts.schema
+        legacy = await client.responses.create(
             model=settings.openai_model,
             instructions=system_prompt,
             input=user_message,
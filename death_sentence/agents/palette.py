@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+
+def filter_scents(all_scents: Dict[str, Any]) -> Dict[str, Any]:
+    # Only include scents with device locations 1-12
+    return {
+        name: info for name, info in all_scents.items()
+        if 1 <= int(info.get("location", 0)) <= 12
+    }
+
+
+@dataclass(frozen=True)
+class Palette:
+    """Read-only snapshot of the scent palette, versioned by a hash of its content."""
+
+    version: str
+    scents: Mapping[str, Mapping[str, Any]]
+    path: Path
+    mtime_ns: int
+    size: int
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.scents)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Plain mutable copy, for callers that need real dicts."""
+        return {name: dict(info) for name, info in self.scents.items()}
+
+
+def palette_version(scents: Dict[str, Any]) -> str:
+    # Canonical JSON, so reformatting the file does not change the version
+    canonical = json.dumps(scents, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class PaletteStore:
+    """
+    Loads scent_classification.json once and serves the same Palette until
+    the file's mtime or size changes. A reload builds the new snapshot
+    completely before swapping it in, so readers never see a partial one;
+    a file that fails to parse keeps the previous palette.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.scents_path)
+        self._palette: Optional[Palette] = None
+        self._failed: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Palette:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Scents JSON not found at {self.path}")
+        key = (stat.st_mtime_ns, stat.st_size)
+        palette = self._palette
+        if palette is not None and key in ((palette.mtime_ns, palette.size), self._failed):
+            return palette
+        with self._lock:
+            palette = self._palette
+            if palette is None or key not in ((palette.mtime_ns, palette.size), self._failed):
+                palette = self._reload(key)
+            return palette
+
+    @property
+    def version(self) -> str:
+        return self.get().version
+
+    def _reload(self, key: Tuple[int, int]) -> Palette:
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                scents = filter_scents(json.load(f))
+        except (ValueError, AttributeError, TypeError) as e:
+            if self._palette is None:
+                raise
+            # Most likely caught mid-save; keep serving the last good palette
+            log.warning("Keeping palette %s, could not parse %s: %s", self._palette.version, self.path, e)
+            self._failed = key
+            return self._palette
+        palette = Palette(
+            version=palette_version(scents),
+            scents=MappingProxyType({name: MappingProxyType(dict(info)) for name, info in scents.items()}),
+            path=self.path,
+            mtime_ns=key[0],
+            size=key[1],
+        )
+        if self._palette is None or palette.version != self._palette.version:
+            log.info("Loaded scent palette %s (%d scents) from %s", palette.version, len(scents), self.path)
+        self._palette = palette
+        self._failed = None
+        return palette
+
+
+palette_store = PaletteStore()
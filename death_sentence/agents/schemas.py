@@ -6,6 +6,8 @@ from pydantic import BaseModel, Field, ValidationError, field_validator
 
 class ComposeRequest(BaseModel):
     sentence: str = Field(min_length=1)
+    # Skip the composition cache lookup (the fresh result is still stored)
+    bypass_cache: bool = False
 
 
 def scent_name_literal(choices: list[str]):
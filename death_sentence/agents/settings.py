@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,6 +16,21 @@ class Settings:
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-5")
     scents_path: Path = Path(os.getenv("SCENTS_JSON_PATH", PROJECT_ROOT / "scent_classification.json"))
     prompts_dir: Path = PROJECT_ROOT / "agents" / "prompts"
+    # Shared OpenAI HTTP client (see openai_client.get_client)
+    openai_timeout: float = float(os.getenv("OPENAI_TIMEOUT", "120"))
+    openai_connect_timeout: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "256"))
+    openai_max_keepalive: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "64"))
+    openai_keepalive_expiry: float = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+    openai_warmup: bool = os.getenv("OPENAI_WARMUP", "1") == "1"
+    # In-flight OpenAI calls per process, and how long a request waits for a slot
+    openai_max_concurrency: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "256"))
+    openai_queue_timeout: float = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "30"))
+    # /compose result cache: in-process LRU, plus a SQLite file shared by workers if set
+    compose_cache_size: int = int(os.getenv("COMPOSE_CACHE_SIZE", "512"))
+    compose_cache_ttl: float = float(os.getenv("COMPOSE_CACHE_TTL", "86400"))
+    compose_cache_db: Optional[Path] = Path(os.getenv("COMPOSE_CACHE_DB")) if os.getenv("COMPOSE_CACHE_DB") else None
 
 
 settings = Settings()
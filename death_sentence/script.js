@@ -278,10 +278,23 @@ async function playSequenceOnDevice() {
 
     const result = await response.json();
 
-    if (result.status === 'success') {
-      alert('✅ Sequence is playing on your device!');
-    } else {
+    if (result.status !== 'success') {
       alert(`❌ Error: ${result.message}`);
+      return;
+    }
+
+    // The backend queues playback as a job and answers at once; the device
+    // is only found and connected once the job runs, so poll until it ends
+    let job = result.job;
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      job = await (await fetch(`http://localhost:5001/jobs/${result.job_id}`)).json();
+    }
+
+    if (job.status === 'completed') {
+      alert('✅ Sequence finished playing on your device!');
+    } else {
+      alert(`❌ Error: ${job.message}`);
     }
   } catch (err) {
     console.error('BLE Error:', err);
@@ -0,0 +1,126 @@
+"""
+On-disk store of devices the backend has connected to.
+
+Keeps each device's address, advertised name, last RSSI, resolved
+characteristic handles, MTU and last successful connect in a small JSON
+file, so a restarted backend (including every debug reload) can connect
+straight to a known device instead of scanning first. Entries that fail
+to connect max_failures times in a row are dropped.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+log = logging.getLogger("device_store")
+
+STORE_VERSION = 1
+
+
+class DeviceStore:
+    """Thread-safe JSON-backed map of address -> device metadata"""
+
+    def __init__(self, path: str = None, max_failures: int = 3):
+        self.path = path
+        self.max_failures = max_failures
+        self._devices = {}
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable device store %s: %s", self.path, e)
+            return
+        if data.get("version") != STORE_VERSION:
+            log.warning("Ignoring device store %s with version %s", self.path, data.get("version"))
+            return
+        with self._lock:
+            self._devices = dict(data.get("devices", {}))
+
+    def _save_locked(self):
+        if not self.path:
+            return
+        data = json.dumps({"version": STORE_VERSION, "devices": self._devices}, indent=2, sort_keys=True)
+        # Write to a temporary file and rename so a crash never leaves half a file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".devices-", suffix=".json")
+            with os.fdopen(handle, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("Could not save device store %s: %s", self.path, e)
+            # Don't leave a .devices-*.json behind for every failed save
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def record_connect(self, address: str, name: str = None, rssi: int = None, handles: dict = None,
+                       mtu: int = None):
+        """Remember a successful connect and reset the failure count"""
+        with self._lock:
+            entry = self._devices.setdefault(address, {})
+            if name:
+                entry["name"] = name
+            if rssi is not None:
+                entry["rssi"] = rssi
+            if handles:
+                entry["handles"] = handles
+            if mtu:
+                entry["mtu"] = mtu
+            entry["last_connected"] = time.time()
+            entry["failures"] = 0
+            self._save_locked()
+
+    def record_failure(self, address: str) -> bool:
+        """Count a failed connect; returns True if the entry was dropped"""
+        with self._lock:
+            entry = self._devices.get(address)
+            if entry is None:
+                return False
+            entry["failures"] = entry.get("failures", 0) + 1
+            dropped = entry["failures"] >= self.max_failures
+            if dropped:
+                del self._devices[address]
+                log.info("Forgetting %s after %d failed connects", address, self.max_failures)
+            self._save_locked()
+            return dropped
+
+    def forget(self, address: str):
+        with self._lock:
+            if self._devices.pop(address, None) is not None:
+                self._save_locked()
+
+    def get(self, address: str):
+        with self._lock:
+            entry = self._devices.get(address)
+            return dict(entry) if entry is not None else None
+
+    def find_by_name(self, name: str):
+        """Address of the most recently connected device with this name, or None"""
+        with self._lock:
+            matches = [(e.get("last_connected", 0), a) for a, e in self._devices.items() if e.get("name") == name]
+        return max(matches)[1] if matches else None
+
+    def most_recent(self):
+        """Address of the most recently connected device, or None"""
+        with self._lock:
+            if not self._devices:
+                return None
+            return max(self._devices, key=lambda a: self._devices[a].get("last_connected", 0))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(entry) for address, entry in self._devices.items()}
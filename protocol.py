@@ -0,0 +1,138 @@
+"""
+Wire protocol for the scent necklace.
+
+Every command is a fixed 15-byte frame:
+
+    F5 | 00 00 00 01 | 02 | 05 | channel | 00 00 | duration_ms | crc | 55
+
+duration_ms is big-endian, and crc is the CRC16 Modbus of the bytes
+between the start and end markers, stored high byte first.
+"""
+
+import struct
+from types import MappingProxyType
+
+FRAME_START = 0xF5
+FRAME_END = 0x55
+FRAME_HEADER = 0x00000001
+CMD_TYPE = 0x02
+SUBCMD_PLAY = 0x05
+
+MIN_CHANNEL = 1
+MAX_CHANNEL = 12
+MIN_DURATION = 1
+MAX_DURATION = 60
+
+# start, header, cmd type, subcmd, channel, padding, duration_ms, crc, end
+_FRAME = struct.Struct(">BIBBBHHHB")
+_CRC = struct.Struct(">H")
+FRAME_SIZE = _FRAME.size
+# Offsets of the CRC field and of the body it covers
+_CRC_OFFSET = FRAME_SIZE - 3
+_BODY_START = 1
+
+
+def _make_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _make_crc_table()
+
+
+def crc16(data) -> int:
+    """CRC16 Modbus of data as an integer"""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc
+
+
+def crc16_modbus(data: bytes) -> bytes:
+    """Calculate CRC16 Modbus checksum"""
+    # Return in big-endian format to match the examples
+    return _CRC.pack(crc16(data))
+
+
+def encode_frame_into(buffer, offset: int, channel: int, duration_ms: int) -> None:
+    """Write one frame into buffer at offset; buffer must be writable"""
+    if not 0 <= channel <= 0xFF:
+        raise ValueError(f"Channel {channel} does not fit in one byte")
+    if not 0 <= duration_ms <= 0xFFFF:
+        raise ValueError(f"Duration {duration_ms}ms does not fit in two bytes")
+    _FRAME.pack_into(
+        buffer, offset,
+        FRAME_START, FRAME_HEADER, CMD_TYPE, SUBCMD_PLAY, channel, 0, duration_ms, 0, FRAME_END,
+    )
+    body = memoryview(buffer)[offset + _BODY_START:offset + _CRC_OFFSET]
+    _CRC.pack_into(buffer, offset + _CRC_OFFSET, crc16(body))
+
+
+def encode_frame(channel: int, duration_sec: int) -> bytes:
+    """Encode a single frame without consulting the cache"""
+    buffer = bytearray(FRAME_SIZE)
+    encode_frame_into(buffer, 0, channel, duration_sec * 1000)
+    return bytes(buffer)
+
+
+# Every legal (channel, duration_sec) frame, built once at import
+FRAME_CACHE = MappingProxyType({
+    (channel, duration): encode_frame(channel, duration)
+    for channel in range(MIN_CHANNEL, MAX_CHANNEL + 1)
+    for duration in range(MIN_DURATION, MAX_DURATION + 1)
+})
+
+
+def encode_frames(commands) -> bytes:
+    """Encode (channel, duration_sec) pairs back to back into one buffer"""
+    commands = list(commands)
+    buffer = bytearray(FRAME_SIZE * len(commands))
+    offset = 0
+    for channel, duration_sec in commands:
+        frame = FRAME_CACHE.get((channel, duration_sec))
+        if frame is None:
+            encode_frame_into(buffer, offset, channel, duration_sec * 1000)
+        else:
+            buffer[offset:offset + FRAME_SIZE] = frame
+        offset += FRAME_SIZE
+    return bytes(buffer)
+
+
+def build_scent_command(scent_id: int, duration_sec: int) -> bytes:
+    """Build scent command with correct CRC encoding"""
+    frame = FRAME_CACHE.get((scent_id, duration_sec))
+    if frame is None:
+        frame = encode_frame(scent_id, duration_sec)
+    return frame
+
+
+def decode_frame(frame):
+    """
+    Parse one frame back into (channel, duration_ms, crc_ok).
+    Raises ValueError if frame is not a 15-byte F5...55 frame.
+    """
+    if len(frame) != FRAME_SIZE:
+        raise ValueError(f"Expected {FRAME_SIZE} bytes, got {len(frame)}")
+    start, _, _, _, channel, _, duration_ms, crc, end = _FRAME.unpack_from(frame)
+    if start != FRAME_START or end != FRAME_END:
+        raise ValueError(f"Bad frame markers {start:02X}...{end:02X}")
+    crc_ok = crc == crc16(memoryview(frame)[_BODY_START:_CRC_OFFSET])
+    return channel, duration_ms, crc_ok
+
+
+def decode_frames(data):
+    """Yield (channel, duration_ms, crc_ok) for back-to-back frames in data"""
+    if len(data) % FRAME_SIZE:
+        raise ValueError(f"{len(data)} bytes is not a whole number of {FRAME_SIZE}-byte frames")
+    view = memoryview(data)
+    for offset in range(0, len(data), FRAME_SIZE):
+        yield decode_frame(view[offset:offset + FRAME_SIZE])
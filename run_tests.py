@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Minimal runner so each test_*.py file can be run directly without pytest:
+
+    python test_backend.py
+
+Every test file ends with sys.exit(run_tests(globals())). pytest collects
+the same test_ functions as usual.
+"""
+
+
+def run_tests(namespace: dict) -> int:
+    """Run every test_ function in namespace; return a process exit code"""
+    tests = [(name, fn) for name, fn in namespace.items() if name.startswith("test_") and callable(fn)]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✅ {name}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+        except Exception as e:
+            # An unexpected error fails this test only; the rest still run
+            failed += 1
+            print(f"❌ {name}: {type(e).__name__}: {e}")
+    return 1 if failed else 0
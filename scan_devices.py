@@ -2,10 +2,22 @@
 """
 BLE Device Scanner
 This script scans for nearby Bluetooth Low Energy devices and displays their information.
+If ble_daemon.py is running, the scan goes through it, since it owns the adapter.
 """
 import asyncio
 import sys
+from types import SimpleNamespace
 from bleak import BleakScanner
+from ble_client import DaemonClient, DaemonError
+
+async def discover(timeout: float):
+    """Scan through a running BLE daemon (it owns the adapter), or locally"""
+    try:
+        result = await asyncio.to_thread(DaemonClient(timeout=timeout + 60).call, "scan", timeout=timeout)
+    except DaemonError:
+        return await BleakScanner.discover(timeout=timeout)
+    print("📡 Scanned through the BLE daemon")
+    return [SimpleNamespace(**device) for device in result.get("devices", [])]
 
 async def scan_devices():
     print("=" * 70)
@@ -16,7 +28,7 @@ async def scan_devices():
     
     try:
         # Scan with longer timeout
-        devices = await BleakScanner.discover(timeout=15.0)
+        devices = await discover(timeout=15.0)
         
         if not devices:
             print("❌ No BLE devices found!")
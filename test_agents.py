@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Tests for the AI backend's OpenAI plumbing in death_sentence/agents"""
+
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from death_sentence.agents import app as agents_app
+from death_sentence.agents import openai_client
+from death_sentence.agents.app import until_disconnected
+from death_sentence.agents.composition_cache import CompositionCache, composition_key
+from death_sentence.agents.schemas import ComposeResponse
+from death_sentence.agents.settings import settings
+
+
+def test_openai_client_is_shared_until_closed():
+    api_key, settings.openai_api_key = settings.openai_api_key, "sk-test"
+    try:
+        client = openai_client.get_client()
+        assert openai_client.get_client() is client
+        assert client.max_retries == settings.openai_max_retries
+        assert client.timeout.connect == settings.openai_connect_timeout
+        asyncio.run(openai_client.close_client())
+        assert openai_client.get_client() is not client
+    finally:
+        asyncio.run(openai_client.close_client())
+        settings.openai_api_key = api_key
+
+
+def test_requests_beyond_concurrency_limit_are_refused():
+    limits = settings.openai_max_concurrency, settings.openai_queue_timeout
+    settings.openai_max_concurrency, settings.openai_queue_timeout = 1, 0.05
+
+    async def run():
+        async with openai_client.request_slot():
+            try:
+                async with openai_client.request_slot():
+                    pass
+            except openai_client.OpenAIBusyError:
+                return True
+        return False
+
+    try:
+        assert asyncio.run(run())
+    finally:
+        settings.openai_max_concurrency, settings.openai_queue_timeout = limits
+        asyncio.run(openai_client.close_client())
+
+
+class _GoneRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def test_call_is_cancelled_when_client_disconnects():
+    cancelled = []
+
+    async def slow_call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        try:
+            await until_disconnected(_GoneRequest(), slow_call())
+        except Exception as e:
+            return getattr(e, "status_code", None)
+
+    assert asyncio.run(run()) == 499
+    assert cancelled
+
+
+COMPOSITION = ComposeResponse.model_validate({
+    "scent_sequence": [{"scent_name": "sage", "scent_duration": 30}, {"scent_name": "garlic", "scent_duration": 30}],
+    "justification": "cached",
+})
+
+
+def test_trivially_different_sentences_share_a_key():
+    key = composition_key("I want to die in the forest alone..", "gpt-5", "v1")
+    assert composition_key("  i want to die in the  forest alone ", "gpt-5", "v1") == key
+    assert composition_key("I want to die in the forest alone..", "gpt-5", "v2") != key
+    assert composition_key("I want to die in the desert alone..", "gpt-5", "v1") != key
+
+
+def test_sqlite_tier_is_shared_between_workers():
+    db = Path(tempfile.mkdtemp()) / "compositions.sqlite"
+    worker_a = CompositionCache(max_entries=1, sqlite_path=db)
+    worker_b = CompositionCache(max_entries=1, sqlite_path=db)
+
+    async def run():
+        await worker_a.put("k1", COMPOSITION)
+        await worker_a.put("k2", COMPOSITION)
+        # k1 was evicted from worker A's LRU but is still on disk
+        assert (await worker_a.get("k1"))[1] == "sqlite"
+        assert (await worker_a.get("k1"))[1] == "memory"
+        cached, tier = await worker_b.get("k2")
+        assert tier == "sqlite" and cached == COMPOSITION
+        assert await CompositionCache(max_entries=0, ttl=-1, sqlite_path=db).get("k3") == (None, None)
+
+    asyncio.run(run())
+    assert worker_a.stats()["memory_hits"] == 1
+    assert worker_a.stats()["sqlite_hits"] == 1
+
+
+def test_compose_serves_repeat_sentences_from_cache():
+    calls = []
+
+    async def fake_compose(sentence, palette):
+        calls.append(sentence)
+        return COMPOSITION
+
+    compose, agents_app.compose_with_openai = agents_app.compose_with_openai, fake_compose
+    api_key, openai_client.settings.openai_api_key = openai_client.settings.openai_api_key, "sk-test"
+    cache, agents_app.composition_cache = agents_app.composition_cache, CompositionCache()
+    try:
+        client = TestClient(agents_app.app)
+        first = client.post("/compose", json={"sentence": "Lost at sea."})
+        second = client.post("/compose", json={"sentence": "lost at sea"})
+        bypass = client.post("/compose", json={"sentence": "lost at sea", "bypass_cache": True})
+        stats = client.get("/cache").json()
+    finally:
+        agents_app.compose_with_openai = compose
+        openai_client.settings.openai_api_key = api_key
+        agents_app.composition_cache = cache
+    assert first.headers["x-composition-cache"] == "MISS"
+    assert second.headers["x-composition-cache"] == "HIT-memory"
+    assert second.json() == first.json()
+    assert bypass.headers["x-composition-cache"] == "BYPASS"
+    assert len(calls) == 2
+    assert stats["memory_hits"] == 1 and stats["misses"] == 1 and stats["bypassed"] == 1
+
+
+def test_compose_skips_a_disabled_cache():
+    async def fake_compose(sentence, palette):
+        return COMPOSITION
+
+    compose, agents_app.compose_with_openai = agents_app.compose_with_openai, fake_compose
+    api_key, openai_client.settings.openai_api_key = openai_client.settings.openai_api_key, "sk-test"
+    cache, agents_app.composition_cache = agents_app.composition_cache, CompositionCache(max_entries=0)
+    try:
+        client = TestClient(agents_app.app)
+        response = client.post("/compose", json={"sentence": "Lost at sea."})
+        stats = client.get("/cache").json()
+    finally:
+        agents_app.compose_with_openai = compose
+        openai_client.settings.openai_api_key = api_key
+        agents_app.composition_cache = cache
+    assert response.headers["x-composition-cache"] == "OFF"
+    assert stats["misses"] == 0
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""Tests for the BLE backend routes, run against ble_simulator.py"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Must be set before backend is imported
+os.environ["BLE_BACKEND"] = "simulator"
+os.environ.setdefault("BLE_SIM_DEVICES", "wear_sim")
+os.environ["BLE_DEVICE_STORE"] = os.path.join(tempfile.mkdtemp(), "ble_devices.json")
+
+import backend
+from ble_simulator import simulator
+from capture import CaptureLog, read_capture
+from protocol import decode_frame
+
+backend.start()
+client = backend.app.test_client()
+
+
+def add_device(name: str, **options):
+    """Put a fresh simulated device in range and wait for it to advertise"""
+    device = simulator.add_device(name, **options)
+    for _ in range(100):
+        if backend.device_registry.get(device.address):
+            break
+        time.sleep(0.01)
+    return device
+
+
+def test_play_scent_writes_golden_frame():
+    device = add_device("wear_golden")
+    response = client.post('/play_scent', json={"scent_id": 1, "duration": 5, "device": "wear_golden"})
+    assert response.status_code == 200
+    assert response.json["status"] == "success"
+    assert device.frames[-1].raw.hex().upper() == "F500000001020501000013882BD455"
+    assert device.frames[-1].crc_ok
+
+
+def test_connection_is_reused_between_requests():
+    device = add_device("wear_reuse")
+    for scent_id in (1, 2, 3):
+        response = client.post('/play_scent', json={"scent_id": scent_id, "duration": 1, "device": device.address})
+        assert response.json["status"] == "success"
+    assert device.connects == 1
+    assert [frame.channel for frame in device.frames] == [1, 2, 3]
+
+
+def test_reconnects_after_device_drops():
+    device = add_device("wear_flaky", drop_after_writes=1)
+    for scent_id in (4, 5):
+        response = client.post('/play_scent', json={"scent_id": scent_id, "duration": 1, "device": "wear_flaky"})
+        assert response.json["status"] == "success"
+    assert device.disconnects >= 1
+    assert device.connects >= 2
+    assert [frame.channel for frame in device.frames] == [4, 5]
+
+
+def test_sequence_steps_land_on_deadlines():
+    device = add_device("wear_timing", write_latency=0.03)
+    sequence = [{"scent_id": 1, "duration": 1}, {"scent_id": 2, "duration": 1}]
+    response = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_timing", "wait": True})
+    assert response.json["status"] == "success"
+    first, second = device.frames
+    assert abs((second.timestamp - first.timestamp) - 1.0) < 0.05
+
+
+def test_reject_policy_when_device_busy():
+    add_device("wear_busy")
+    sequence = [{"scent_id": 1, "duration": 2}]
+    job_id = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_busy"}).json["job_id"]
+    time.sleep(0.3)
+    response = client.post('/play_scent', json={"scent_id": 2, "duration": 1, "device": "wear_busy", "policy": "reject"})
+    assert response.status_code == 409
+    assert client.delete(f'/jobs/{job_id}').json["status"] == "success"
+    time.sleep(0.1)
+    assert client.get(f'/jobs/{job_id}').json["status"] == "cancelled"
+
+
+def test_job_waiting_behind_another_stays_queued():
+    add_device("wear_waiting")
+    sequence = [{"scent_id": 1, "duration": 1}]
+    first = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_waiting"}).json["job_id"]
+    second = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_waiting"}).json["job_id"]
+    time.sleep(0.3)
+    assert client.get(f'/jobs/{first}').json["status"] == "running"
+    waiting = client.get(f'/jobs/{second}').json
+    assert waiting["status"] == "queued"
+    assert waiting["elapsed"] == 0.0
+    assert waiting["remaining"] == waiting["total_duration"]
+    for _ in range(60):
+        if client.get(f'/jobs/{second}').json["status"] == "completed":
+            break
+        time.sleep(0.05)
+    assert client.get(f'/jobs/{second}').json["status"] == "completed"
+
+
+def test_import_alone_does_not_start_ble():
+    # The debug reloader's watcher imports the module but must not scan
+    code = ("import threading, backend; "
+            "assert not any(t.name == 'ble-event-loop' for t in threading.enumerate())")
+    env = dict(os.environ, BLE_DEVICE_STORE="")
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unknown_device_is_reported():
+    scan_timeout, backend.SCAN_TIMEOUT = backend.SCAN_TIMEOUT, 0.2
+    try:
+        response = client.post('/play_scent', json={"scent_id": 1, "duration": 1, "device": "wear_missing"})
+    finally:
+        backend.SCAN_TIMEOUT = scan_timeout
+    assert response.json["status"] == "error"
+    assert "not found" in response.json["message"]
+
+
+def test_simulator_flags_bad_crc():
+    device = simulator.add_device("wear_crc")
+    frame = bytearray(backend.build_scent_command(3, 10))
+    frame[-2] ^= 0xFF
+    received = device.receive(bytes(frame))
+    assert received.channel == 3
+    assert received.duration_ms == 10000
+    assert not received.crc_ok
+
+
+def test_warm_up_keeps_pinned_link_alive():
+    device = add_device("wear_warm")
+    backoff, backend.RECONNECT_BACKOFF_INITIAL = backend.RECONNECT_BACKOFF_INITIAL, 0.05
+    try:
+        warmed = backend.ble_loop.run(backend.warm_up(["wear_warm"]), timeout=10)
+        assert warmed == {"wear_warm": device.address}
+        assert device.connects == 1
+        backend.ble_loop.run(backend.connection_manager.stop_keepalive())
+        backend.ble_loop.loop.call_soon_threadsafe(backend.connection_manager.start_keepalive, 0.05)
+        time.sleep(0.3)
+        assert device.pings >= 1
+        assert device.frames == []
+
+        # A pinned device that disappears is retried until it comes back
+        simulator.remove_device(device.address)
+        time.sleep(0.2)
+        simulator.devices[device.address] = device
+        time.sleep(0.5)
+        assert backend.connection_manager.is_connected(device.address)
+        assert device.connects == 2
+    finally:
+        backend.RECONNECT_BACKOFF_INITIAL = backoff
+        backend.connection_manager.unpin(device.address)
+        backend.ble_loop.run(backend.connection_manager.stop_keepalive())
+
+
+def test_scan_matches_service_uuid_and_prefers_strongest():
+    unnamed = add_device("nus_only", rssi=-70)
+    strong = add_device("wear_strong", rssi=-20)
+    try:
+        assert backend.device_registry.get(unnamed.address) is not None
+        assert backend.device_registry.strongest().address == strong.address
+    finally:
+        simulator.remove_device(unnamed.address)
+        simulator.remove_device(strong.address)
+        backend.device_registry.clear()
+
+
+def test_connected_devices_are_persisted():
+    device = add_device("wear_persist")
+    client.post('/play_scent', json={"scent_id": 1, "duration": 1, "device": "wear_persist"})
+    time.sleep(0.1)
+    stored = backend.DeviceStore(backend.DEVICE_STORE_PATH).get(device.address)
+    assert stored["name"] == "wear_persist"
+    assert stored["handles"] == {"write": 14, "notify": 16}
+    assert stored["failures"] == 0
+
+
+def test_acknowledgements_measure_rtt_and_resend_lost_frames():
+    device = add_device("wear_ack", ack=True, ack_latency=0.02)
+    response = client.post('/play_scent', json={"scent_id": 1, "duration": 1, "device": "wear_ack"})
+    assert response.json["status"] == "success"
+    # The first acknowledgement is what marks the device as acknowledging
+    time.sleep(0.05)
+    assert backend.connection_manager.supports_acks(device.address)
+    assert backend.connection_manager.rtt(device.address) >= 0.02
+
+    response = client.post('/play_scent', json={"scent_id": 2, "duration": 1, "device": "wear_ack"})
+    assert response.json["acknowledged"]
+    assert response.json["rtt_ms"] >= 20
+
+    # Stop acknowledging: the step is resent once and reported
+    device.ack = False
+    sequence = [{"scent_id": 3, "duration": 1}]
+    timeout, backend.ACK_TIMEOUT = backend.ACK_TIMEOUT, 0.1
+    try:
+        response = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_ack", "wait": True})
+    finally:
+        backend.ACK_TIMEOUT = timeout
+    assert response.json["timing"]["resent"] == 1
+    assert [frame.channel for frame in device.frames] == [1, 2, 3, 3]
+
+
+def test_lost_acknowledgement_does_not_shift_later_acks():
+    device = add_device("wear_lost_ack", ack=True, ack_latency=0.02)
+    client.post('/play_scent', json={"scent_id": 1, "duration": 1, "device": "wear_lost_ack"})
+    time.sleep(0.05)
+    assert backend.connection_manager.supports_acks(device.address)
+
+    # Only the first step's echo goes missing
+    device.drop_acks = 1
+    sequence = [{"scent_id": channel, "duration": 1} for channel in (4, 5, 6)]
+    timeout, backend.ACK_TIMEOUT = backend.ACK_TIMEOUT, 0.1
+    try:
+        response = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_lost_ack", "wait": True})
+    finally:
+        backend.ACK_TIMEOUT = timeout
+    timing = response.json["timing"]
+    assert timing["resent"] == 1
+    # The resend and the two later steps are each matched to their own echo
+    assert timing["acked"] == 3
+    assert timing["mean_rtt_ms"] < 100
+    assert min(timing["lateness_ms"]) > -50
+    assert [frame.channel for frame in device.frames] == [1, 4, 4, 5, 6]
+
+
+def test_group_first_step_uses_measured_lead():
+    slow = add_device("wear_group_slow", write_latency=0.08)
+    fast = add_device("wear_group_fast", write_latency=0.01)
+    sequence = [{"scent_id": 2, "duration": 1}]
+    response = client.post('/play_group', json={"sequence": sequence, "devices": [slow.name, fast.name], "wait": True})
+    assert response.json["status"] == "success"
+    timing = response.json["timing"]
+    # Neither link had been written to, yet both first frames land on the shared deadline
+    for address in (slow.address, fast.address):
+        assert abs(timing["devices"][address]["lateness_ms"][0]) < 30
+    assert timing["max_skew_ms"] < 30
+    assert [frame.channel for frame in slow.frames] == [2]
+
+
+def test_no_response_writes_batch_queued_frames():
+    device = add_device("wear_batch", mtu=247, write_latency=0.02)
+    mode, batch, capture_log = backend.WRITE_MODE, backend.BATCH_WRITES, backend.capture_log
+    capture_path = os.path.join(tempfile.mkdtemp(), "batch.cap")
+    backend.WRITE_MODE, backend.BATCH_WRITES = "no-response", True
+    backend.capture_log = CaptureLog(capture_path)
+    try:
+        async def burst():
+            frames = [backend._build_frame(channel, 1) for channel in range(1, 7)]
+            await backend.command_queues.submit_frame(device.address, frames[0])
+            await asyncio.gather(*(backend.command_queues.submit_frame(device.address, f, "append") for f in frames))
+
+        backend.ble_loop.run(burst(), timeout=10)
+    finally:
+        backend.capture_log.close()
+        backend.WRITE_MODE, backend.BATCH_WRITES, backend.capture_log = mode, batch, capture_log
+    assert backend.connection_manager.mtu(device.address) == 247
+    assert backend.connection_manager.write_mode(device.address) == "no-response"
+    assert [frame.channel for frame in device.frames] == [1, 1, 2, 3, 4, 5, 6]
+    assert all(frame.crc_ok for frame in device.frames)
+    assert device.writes < len(device.frames)
+    assert backend.command_queues.stats()[device.address]["batched"] > 0
+    # Batched writes are still captured one frame per record
+    captured = [decode_frame(c.frame) for c in read_capture(capture_path)]
+    assert [channel for channel, _, _ in captured] == [1, 1, 2, 3, 4, 5, 6]
+
+
+def test_metrics_endpoint_reports_hot_path():
+    add_device("wear_metrics")
+    client.post('/play_scent', json={"scent_id": 7, "duration": 2, "device": "wear_metrics"})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    text = response.get_data(as_text=True)
+    assert 'ble_scent_seconds_total{channel="7"} 2' in text
+    assert 'ble_write_seconds_bucket{le="+Inf"}' in text
+    assert 'ble_connect_seconds_count{result="ok"}' in text
+    assert 'ble_frame_errors_total{kind="crc"} 0' in text
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
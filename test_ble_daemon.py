@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Tests for the BLE daemon and its client, run against ble_simulator.py"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Must be set before backend is imported
+os.environ["BLE_BACKEND"] = "simulator"
+os.environ.setdefault("BLE_SIM_DEVICES", "wear_sim")
+os.environ.setdefault("BLE_DEVICE_STORE", os.path.join(tempfile.mkdtemp(), "ble_devices.json"))
+
+import backend
+from ble_client import DaemonClient, DaemonError, parse_address
+from ble_daemon import BLEDaemon, handle_request
+from ble_simulator import simulator
+
+backend.start()
+client = backend.app.test_client()
+
+
+def add_device(name: str, **options):
+    """Put a fresh simulated device in range and wait for it to advertise"""
+    device = simulator.add_device(name, **options)
+    for _ in range(100):
+        if backend.device_registry.get(device.address):
+            break
+        time.sleep(0.01)
+    return device
+
+
+def start_daemon() -> BLEDaemon:
+    return BLEDaemon(os.path.join(tempfile.mkdtemp(), "ble.sock")).start()
+
+
+def test_addresses_are_parsed():
+    assert parse_address("127.0.0.1:5002")[1] == ("127.0.0.1", 5002)
+    assert parse_address("/tmp/ble.sock")[1] == "/tmp/ble.sock"
+
+
+def test_scripts_drive_devices_through_the_daemon():
+    device = add_device("wear_daemon")
+    daemon = start_daemon()
+    try:
+        daemon_client = DaemonClient(daemon.address)
+        assert daemon_client.call("ping")["status"] == "ok"
+        result = daemon_client.call("play_scent", scent_id=4, duration=2, devices=["wear_daemon"])
+        assert result["status"] == "success"
+        assert device.frames[-1].channel == 4
+        result, code = daemon_client.request("play_scent", bogus=1)
+        assert code == 400
+        # Scripts get the same validation as the HTTP routes
+        result, code = daemon_client.request("play_scent", scent_id=13, duration=2, devices="wear_daemon")
+        assert code == 400
+        assert "scent_id" in result["message"]
+        result, code = daemon_client.request("play_sequence", sequence="not a list")
+        assert code == 400
+        result = daemon_client.call("play_scent", scent_id=5, duration=2, devices="wear_daemon")
+        assert result["status"] == "success"
+        assert device.frames[-1].channel == 5
+        result, code = daemon_client.request("no_such_command")
+        assert code == 400
+        daemon_client.close()
+    finally:
+        daemon.shutdown()
+
+
+def test_internal_type_errors_are_not_blamed_on_the_caller():
+    def broken(value: int = 0):
+        return None + value
+
+    backend.COMMANDS["broken"] = broken
+    try:
+        assert handle_request(b'{"command": "broken", "params": {"value": 1}}')["code"] == 500
+        assert handle_request(b'{"command": "broken", "params": {"other": 1}}')["code"] == 400
+    finally:
+        del backend.COMMANDS["broken"]
+
+
+def test_http_layer_forwards_to_daemon():
+    device = add_device("wear_forward")
+    daemon = start_daemon()
+    forwarding = backend.daemon_client
+    backend.daemon_client = DaemonClient(daemon.address)
+    try:
+        sequence = [{"scent_id": 2, "duration": 1}]
+        response = client.post('/play_sequence', json={"sequence": sequence, "device": "wear_forward"})
+        assert response.status_code == 202
+        job_id = response.json["job_id"]
+        assert client.get(f'/jobs/{job_id}').json["job_id"] == job_id
+        assert client.get('/jobs/missing').status_code == 404
+        for _ in range(100):
+            if client.get(f'/jobs/{job_id}').json["status"] == "completed":
+                break
+            time.sleep(0.05)
+        assert [frame.channel for frame in device.frames] == [2]
+        assert any(d["address"] == device.address for d in client.get('/devices').json["devices"])
+    finally:
+        backend.daemon_client.close()
+        backend.daemon_client = forwarding
+        daemon.shutdown()
+
+
+def test_forwarding_workers_leave_daemon_files_alone():
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, BLE_DAEMON=os.path.join(directory, "ble.sock"),
+               BLE_CAPTURE_PATH=os.path.join(directory, "frames.cap"),
+               BLE_DEVICE_STORE=os.path.join(directory, "ble_devices.json"))
+    code = "import backend; assert backend.capture_log is None and backend.device_store is None"
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert os.listdir(directory) == []
+
+
+def test_unreachable_daemon_is_reported():
+    forwarding = backend.daemon_client
+    backend.daemon_client = DaemonClient(os.path.join(tempfile.mkdtemp(), "missing.sock"))
+    try:
+        response = client.post('/play_scent', json={"scent_id": 1, "duration": 1})
+        assert response.status_code == 503
+        assert client.get('/devices').status_code == 503
+    finally:
+        backend.daemon_client = forwarding
+    try:
+        DaemonClient(os.path.join(tempfile.mkdtemp(), "missing.sock")).call("ping")
+    except DaemonError:
+        pass
+    else:
+        raise AssertionError("an unreachable daemon should raise DaemonError")
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
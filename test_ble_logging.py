@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Tests for the queued, lazily formatted logging in ble_logging.py"""
+
+import json
+import logging
+import sys
+
+from ble_logging import JSONFormatter, LazyHex, _parse_levels
+
+
+class _CountingHex(LazyHex):
+    __slots__ = ("calls",)
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return super().__str__()
+
+
+def test_hex_is_only_formatted_when_emitted():
+    logger = logging.getLogger("test_ble_logging.quiet")
+    logger.setLevel(logging.INFO)
+    frame = _CountingHex(b"\xf5\x00\x55")
+    logger.debug("Command bytes: %s", frame)
+    assert frame.calls == 0
+    assert str(frame) == "F50055"
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord("backend", logging.INFO, __file__, 1, "Sent scent %d", (3,), None)
+    record.address = "AA:BB"
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "Sent scent 3"
+    assert entry["address"] == "AA:BB"
+    assert entry["level"] == "INFO"
+
+
+def test_per_module_levels_are_parsed():
+    assert _parse_levels("backend=debug, werkzeug=ERROR,,bad") == {"backend": "DEBUG", "werkzeug": "ERROR"}
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Tests for the frame capture log and offline replay"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+from ble_simulator import SimulatedBleakClient, simulator
+from capture import CaptureLog, read_capture, replay
+from protocol import build_scent_command
+
+
+def _capture_path():
+    handle, path = tempfile.mkstemp(suffix=".cap")
+    os.close(handle)
+    return path
+
+
+def test_capture_round_trip():
+    path = _capture_path()
+    try:
+        log = CaptureLog(path)
+        log.record("AA:BB", build_scent_command(1, 5), timestamp=10.0)
+        log.record("CC:DD", build_scent_command(2, 5), timestamp=10.5)
+        log.close()
+        # A second session appends to the same file
+        log = CaptureLog(path)
+        log.record("AA:BB", build_scent_command(3, 1), timestamp=20.0)
+        log.close()
+
+        frames = list(read_capture(path))
+        assert [(f.address, f.timestamp) for f in frames] == [("AA:BB", 10.0), ("CC:DD", 10.5), ("AA:BB", 20.0)]
+        assert frames[0].frame.hex().upper() == "F500000001020501000013882BD455"
+        assert all(f.wall_time is not None for f in frames)
+    finally:
+        os.remove(path)
+
+
+def test_close_writes_out_queued_records():
+    path = _capture_path()
+    try:
+        log = CaptureLog(path)
+        for i in range(200):
+            log.record("AA:BB", build_scent_command((i % 12) + 1, 1), timestamp=float(i))
+        log.close()
+        log.close()
+        assert [f.timestamp for f in read_capture(path)] == [float(i) for i in range(200)]
+    finally:
+        os.remove(path)
+
+
+def test_replay_into_simulator_keeps_spacing():
+    path = _capture_path()
+    try:
+        log = CaptureLog(path)
+        log.record("REPLAY:01", build_scent_command(1, 1), timestamp=0.0)
+        log.record("REPLAY:01", build_scent_command(2, 1), timestamp=0.2)
+        log.close()
+        device = simulator.add_device("wear_replay", address="REPLAY:01", connect_latency=0.0, write_latency=0.0)
+        try:
+            sent = asyncio.run(replay(path, client_class=SimulatedBleakClient))
+        finally:
+            simulator.remove_device(device.address)
+        assert len(sent) == 2
+        first, second = device.frames
+        assert [first.channel, second.channel] == [1, 2]
+        assert abs((second.timestamp - first.timestamp) - 0.2) < 0.05
+    finally:
+        os.remove(path)
+
+
+def test_replay_rebases_each_session():
+    path = _capture_path()
+    try:
+        log = CaptureLog(path)
+        log.record("REPLAY:02", build_scent_command(1, 1), timestamp=1000.0)
+        log.record("REPLAY:02", build_scent_command(2, 1), timestamp=1000.2)
+        log.close()
+        # After a reboot the monotonic clock starts again far below the first session
+        log = CaptureLog(path)
+        log.record("REPLAY:02", build_scent_command(3, 1), timestamp=5.0)
+        log.record("REPLAY:02", build_scent_command(4, 1), timestamp=5.2)
+        log.close()
+        assert [f.session for f in read_capture(path)] == [1, 1, 2, 2]
+        device = simulator.add_device("wear_replay_sessions", address="REPLAY:02", connect_latency=0.0, write_latency=0.0)
+        try:
+            sent = asyncio.run(replay(path, client_class=SimulatedBleakClient))
+        finally:
+            simulator.remove_device(device.address)
+        assert [frame.channel for frame in device.frames] == [1, 2, 3, 4]
+        times = [frame.timestamp for frame in device.frames]
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        assert abs(gaps[0] - 0.2) < 0.05
+        assert gaps[1] < 0.05
+        assert abs(gaps[2] - 0.2) < 0.05
+        assert all(abs(lateness) < 0.05 for _, _, lateness in sent)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
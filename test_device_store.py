@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for the persistent device store in device_store.py"""
+
+import os
+import sys
+import tempfile
+
+from device_store import DeviceStore
+
+
+def _store_path():
+    return os.path.join(tempfile.mkdtemp(), "ble_devices.json")
+
+
+def test_store_survives_restart():
+    path = _store_path()
+    store = DeviceStore(path)
+    store.record_connect("AA:01", name="wear_left", rssi=-60, handles={"write": 14})
+    store.record_connect("AA:02", name="wear_right", rssi=-50)
+
+    reloaded = DeviceStore(path)
+    assert reloaded.get("AA:01")["handles"] == {"write": 14}
+    assert reloaded.find_by_name("wear_left") == "AA:01"
+    assert reloaded.most_recent() == "AA:02"
+
+
+def test_repeated_failures_invalidate_entry():
+    path = _store_path()
+    store = DeviceStore(path, max_failures=3)
+    store.record_connect("AA:03", name="wear_gone")
+    assert not store.record_failure("AA:03")
+    assert not store.record_failure("AA:03")
+    assert store.record_failure("AA:03")
+    assert DeviceStore(path).get("AA:03") is None
+
+    # A successful connect resets the count
+    store.record_connect("AA:04", name="wear_flaky")
+    store.record_failure("AA:04")
+    store.record_connect("AA:04")
+    assert store.get("AA:04")["failures"] == 0
+
+
+def test_unreadable_store_is_ignored():
+    path = _store_path()
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert DeviceStore(path).most_recent() is None
+
+
+def test_failed_save_removes_temp_file():
+    path = _store_path()
+    # A directory in the store's place makes the final rename fail
+    os.makedirs(os.path.join(path, "occupied"))
+    DeviceStore(path).record_connect("AA:05", name="wear_unsaved")
+    assert [name for name in os.listdir(os.path.dirname(path)) if name.startswith(".devices-")] == []
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Tests for the Prometheus-style metrics in metrics.py"""
+
+import sys
+
+from metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.01, 0.1))
+    for value in (0.005, 0.01, 0.05, 2.0):
+        histogram.observe(value)
+    text = registry.render()
+    assert 'latency_seconds_bucket{le="0.01"} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "# TYPE latency_seconds histogram" in text
+
+
+def test_counter_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("scent_seconds_total", "Scent seconds", ("channel",))
+    counter.inc(3, amount=5)
+    counter.inc(3, amount=2)
+    counter.inc(11)
+    assert counter.value(3) == 7
+    text = registry.render()
+    assert 'scent_seconds_total{channel="3"} 7' in text
+    assert 'scent_seconds_total{channel="11"} 1' in text
+    try:
+        counter.inc()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("missing labels should raise ValueError")
+
+
+def test_gauge_is_overwritten():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("rtt_seconds", "RTT", ("address",))
+    gauge.set(0.5, "AA")
+    gauge.set(0.25, "AA")
+    text = registry.render()
+    assert "# TYPE rtt_seconds gauge" in text
+    assert 'rtt_seconds{address="AA"} 0.25' in text
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Tests for the versioned scent palette in death_sentence/agents/palette.py"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from death_sentence.agents import openai_client
+from death_sentence.agents.palette import PaletteStore
+
+
+def write_scents(path: Path, scents: dict, mtime_ns: int):
+    path.write_text(json.dumps(scents), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_palette_is_filtered_and_reused_until_file_changes():
+    path = Path(tempfile.mkdtemp()) / "scents.json"
+    write_scents(path, {"sage": {"location": "3"}, "spare": {"location": "0"}}, 1_000_000_000)
+    store = PaletteStore(path)
+    first = store.get()
+    assert first.names == ["sage"]
+    assert store.get() is first
+
+    # Same content written again: reloaded, but the version is unchanged
+    write_scents(path, {"spare": {"location": "0"}, "sage": {"location": "3"}}, 2_000_000_000)
+    second = store.get()
+    assert second is not first
+    assert second.version == first.version
+
+    write_scents(path, {"sage": {"location": "3"}, "rose": {"location": "4"}}, 3_000_000_000)
+    third = store.get()
+    assert third.names == ["sage", "rose"]
+    assert third.version != first.version
+    try:
+        third.scents["rose"] = {}
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("palette snapshots should be read-only")
+
+
+def test_unparseable_file_keeps_last_good_palette():
+    path = Path(tempfile.mkdtemp()) / "scents.json"
+    write_scents(path, {"sage": {"location": "3"}}, 1_000_000_000)
+    store = PaletteStore(path)
+    good = store.get()
+    path.write_text('{"sage": ', encoding="utf-8")
+    assert store.get() is good
+
+
+def test_prompt_artifacts_are_cached_per_palette_version():
+    path = Path(tempfile.mkdtemp()) / "scents.json"
+    write_scents(path, {"sage": {"location": "3"}}, 1_000_000_000)
+    store = PaletteStore(path)
+    first = openai_client.prompt_artifacts("system_prompt.j2", store.get())
+    assert openai_client.prompt_artifacts("system_prompt.j2", store.get()) is first
+    assert "sage" in first.system_prompt
+    assert first.schema["properties"]["scent_sequence"]["items"]["properties"]["scent_name"]["enum"] == ["sage"]
+
+    write_scents(path, {"sage": {"location": "3"}, "rose": {"location": "4"}}, 2_000_000_000)
+    second = openai_client.prompt_artifacts("system_prompt.j2", store.get())
+    assert second is not first
+    assert "rose" in second.system_prompt
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))
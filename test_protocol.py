@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Golden-vector tests for the scent frame encoder in protocol.py"""
+
+import sys
+
+from protocol import (
+    FRAME_CACHE,
+    FRAME_SIZE,
+    build_scent_command,
+    crc16_modbus,
+    decode_frame,
+    decode_frames,
+    encode_frame,
+    encode_frames,
+)
+
+# Frames captured from the vendor examples (testing/hex.py)
+GOLDEN_FRAMES = {
+    (1, 5): "F500000001020501000013882BD455",
+    (2, 5): "F500000001020502000013882B9055",
+}
+
+
+def reference_crc16_modbus(data: bytes) -> bytes:
+    """Original bit-by-bit implementation the table must agree with"""
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return bytes([(crc >> 8) & 0xFF, crc & 0xFF])
+
+
+def reference_build_command(scent: int, duration_sec: int) -> bytes:
+    body = bytes([0x00, 0x00, 0x00, 0x01, 0x02, 0x05, scent, 0x00, 0x00])
+    body += (duration_sec * 1000).to_bytes(2, 'big')
+    return bytes([0xF5]) + body + reference_crc16_modbus(body) + bytes([0x55])
+
+
+def test_golden_frames():
+    for (scent_id, duration), expected in GOLDEN_FRAMES.items():
+        assert build_scent_command(scent_id, duration).hex().upper() == expected
+
+
+def test_crc_table_matches_bitwise_crc():
+    for data in (b"", b"\x00", b"\xff" * 7, bytes(range(256))):
+        assert crc16_modbus(data) == reference_crc16_modbus(data)
+
+
+def test_cache_covers_every_legal_frame():
+    assert len(FRAME_CACHE) == 12 * 60
+    for (scent_id, duration), frame in FRAME_CACHE.items():
+        assert len(frame) == FRAME_SIZE
+        assert frame == reference_build_command(scent_id, duration)
+
+
+def test_cache_is_immutable():
+    try:
+        FRAME_CACHE[(1, 5)] = b""
+    except TypeError:
+        return
+    raise AssertionError("FRAME_CACHE accepted an assignment")
+
+
+def test_uncached_frames_are_encoded():
+    assert build_scent_command(13, 5) == reference_build_command(13, 5)
+    assert build_scent_command(1, 65) == reference_build_command(1, 65)
+
+
+def test_out_of_range_duration_raises():
+    try:
+        encode_frame(1, 66)
+    except ValueError:
+        return
+    raise AssertionError("66 s does not fit in the 2-byte duration field")
+
+
+def test_encode_frames_packs_back_to_back():
+    commands = [(4, 5), (11, 3), (7, 8), (5, 2)]
+    packed = encode_frames(commands)
+    assert packed == b"".join(reference_build_command(c, d) for c, d in commands)
+
+
+def test_decode_round_trips_every_cached_frame():
+    for (scent_id, duration), frame in FRAME_CACHE.items():
+        assert decode_frame(frame) == (scent_id, duration * 1000, True)
+
+
+def test_decode_flags_bad_crc():
+    frame = bytearray.fromhex(GOLDEN_FRAMES[(1, 5)])
+    frame[12] ^= 0x01
+    assert decode_frame(bytes(frame)) == (1, 5000, False)
+
+
+def test_decode_rejects_malformed_frames():
+    for bad in (b"", bytes.fromhex(GOLDEN_FRAMES[(1, 5)])[:-1], b"\x00" * FRAME_SIZE):
+        try:
+            decode_frame(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad!r} decoded without error")
+
+
+def test_decode_frames_splits_a_stream():
+    commands = [(4, 5), (11, 3), (7, 8)]
+    decoded = list(decode_frames(encode_frames(commands)))
+    assert decoded == [(c, d * 1000, True) for c, d in commands]
+
+
+if __name__ == "__main__":
+    from run_tests import run_tests
+    sys.exit(run_tests(globals()))